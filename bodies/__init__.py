@@ -1,3 +1,4 @@
 from quad import Quadcopter
 from generic_device import GenericDevice
-from sim_stepper import SimStepper
\ No newline at end of file
+from sim_stepper import SimStepper
+from crowd_stepper import CrowdStepper
\ No newline at end of file
@@ -0,0 +1,88 @@
+import ode
+import numpy as np
+from object_types import Device
+from field_types import FieldObject
+
+class CrowdStepper(Device, FieldObject):
+    """Fake footstep vibrations from a whole crowd of walkers, as one emitter.
+
+       Every walker's steps (times, positions and intensities) are generated up front as arrays,
+       and each update pushes the steps that have happened since the last one to the field in one
+       batch. Walkers wander around the area at their own pace, turning a little at every step
+       and turning back at its edges; their steps alternate between the left and right foot.
+       The body only anchors the crowd, so it never moves. The crowd isn't added to the field as a
+       receiver, since it doesn't listen; it only pushes its steps there.
+    """
+    pushesEmissions = True
+    frequency = 360
+
+    def makePhysicsBody(self):
+        physicsWorld = self.environment.world
+
+        mainBody = ode.Body(physicsWorld)
+        mainBody.setKinematic()
+
+        self.physicsBody = mainBody
+
+    def applyParameters(self, params):
+        self.walkers = int(params.get('walkers', 50))
+        self.duration = float(params.get('duration', 60.0))
+        corners = [[float(i) for i in p.split(',')] for p in params.get('area', '-4,-1,-4;4,-1,4').split(';')]
+        self.areaLower = np.minimum(corners[0], corners[1])
+        self.areaUpper = np.maximum(corners[0], corners[1])
+        self.stepDt = float(params.get('stepDt', 1.0))
+        self.stepTSigma = float(params.get('stepTSigma', 0.1))
+        self.stepPSigma = float(params.get('stepPSigma', 0.1))
+        self.strideLength = float(params.get('strideLength', 0.7))
+        self.footOffset = float(params.get('footOffset', 0.1))
+        self.turnSigma = float(params.get('turnSigma', 0.1)) # radians per step
+        seed = params.get('seed')
+        self.random = np.random.RandomState(None if seed is None else int(seed))
+
+        self.nextStep = 0
+        self.prepareSteps()
+
+    def prepareSteps(self):
+        """ Steps of every walker, sorted by time into stepTimes, stepPositions and stepIntensities """
+        n = int(np.ceil(self.duration/max(self.stepDt - 3*self.stepTSigma, 0.1*self.stepDt))) + 1
+        rng = self.random
+        times = 0.4 + rng.uniform(0, self.stepDt, (self.walkers, 1)) + \
+                np.cumsum(np.abs(rng.normal(self.stepDt, self.stepTSigma, (self.walkers, n))), axis=1)
+
+        heading = rng.uniform(0, 2*np.pi, (self.walkers, 1)) + \
+                  np.cumsum(rng.normal(0, self.turnSigma, (self.walkers, n)), axis=1)
+        start = rng.uniform(self.areaLower, self.areaUpper, (self.walkers, 1, 3))
+        stride = np.stack([np.cos(heading), np.zeros_like(heading), np.sin(heading)], axis=-1)*self.strideLength
+        positions = start + np.cumsum(stride, axis=1)
+        # alternate feet, either side of the walking line
+        side = np.where(np.arange(n) % 2 == 0, 1.0, -1.0)[None, :]
+        positions[:, :, 0] += -np.sin(heading)*side*self.footOffset
+        positions[:, :, 2] += np.cos(heading)*side*self.footOffset
+        positions = self._fold(positions)
+
+        intensity = 20
+        intensities = rng.normal(intensity, self.stepPSigma*intensity, (self.walkers, n))
+
+        taken = times <= self.duration
+        order = np.argsort(times[taken], kind='mergesort')
+        self.stepTimes = times[taken][order]
+        self.stepPositions = positions[taken][order]*self.environment.lengthScale
+        self.stepIntensities = intensities[taken][order]
+
+    def _fold(self, positions):
+        """ Where walkers that turn back at the edges of the area end up, for the unbounded positions """
+        size = self.areaUpper - self.areaLower
+        flat = size <= 0
+        size = np.where(flat, 1.0, size)
+        offset = np.mod(positions - self.areaLower, 2*size)
+        folded = self.areaLower + np.where(offset > size, 2*size - offset, offset)
+        return np.where(flat, self.areaLower, folded)
+
+    def updatePhysics(self, dt):
+        # push the steps that have happened, once they have
+        end = np.searchsorted(self.stepTimes, self.environment.time, side='right')
+        if end > self.nextStep:
+            batch = slice(self.nextStep, end)
+            self.environment.pushFieldEmissions('Vibration', self, self.frequency, self.stepIntensities[batch],
+                                                self.stepTimes[batch], self.stepPositions[batch])
+            self.nextStep = end
@@ -7,6 +7,7 @@ from sensors import Geophone
 
 class SimStepper(Device, FieldObject):
     """An object with no body that generates fake footstep vibrations"""
+    pushesEmissions = True
     def makePhysicsBody(self):
         physicsWorld = self.environment.world
 
@@ -17,12 +18,14 @@ class SimStepper(Device, FieldObject):
         self.environment.addFieldObject('Vibration', self)
 
 
-    def getRadiatedValues(self):
-        if not self.stepMade:
-            if self.lastT >= self.stepT:
-                self.stepMade = True
-                return [(360, self.currentStep[1], self.stepT)]
-        return [(None, None, None)]
+    def makeStep(self):
+        # push the step to the field once it has happened
+        if not self.stepMade and self.lastT >= self.stepT:
+            self.stepMade = True
+            # from where the step landed, even if we have moved on to the next one since
+            position = [self.environment.lengthScale*c for c in self.currentStep[0]]
+            self.environment.pushFieldEmission('Vibration', self, 360, self.currentStep[1], self.stepT,
+                                               position=position)
 
     def applyParameters(self, params):
         # time, step position, relative intensity
@@ -64,12 +67,14 @@ class SimStepper(Device, FieldObject):
         currTIdx = bisect_left(self.stepTimes, self.lastT)
         # the value at currTIdx >= now
         if currTIdx >= len(self.stepTimes):
+            self.makeStep() # the last one
             return
         if self.stepMade and self.stepTimes[currTIdx] != self.stepT:
             self.stepMade = False
             self.stepT = self.stepTimes[currTIdx]
             self.currentStep = self.steps[self.stepT]
         self.setPosition(self.currentStep[0])
+        self.makeStep()
 
             
 
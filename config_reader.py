@@ -144,6 +144,8 @@ class ConfigReader(object):
         dt = 1.0/(float(fs))
 
         sim = SimulationManager(dt)
+        sim.pipelineFields = root.get('pipelineFields', 'false').lower() == 'true'
+        sim.concurrentFields = sim.pipelineFields or root.get('concurrentFields', 'false').lower() == 'true'
         cr = ConfigReader(sim) # TODO: these should all be class methods...?
         
         # create the fields
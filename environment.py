@@ -2,6 +2,8 @@ import ode
 import logging
 
 from field_types import Field
+from geometry_frame import GeometryFrame
+from field_workers import FieldWorker
 from heatmap import Heatmap
 import numpy as np
 
@@ -23,15 +25,14 @@ class FieldVisualiser(object):
         for s in self.spheres:
             s.visible = False
         self.spheres = []
-        i = 0
-        for sphereList in [field.objects.values()[2]]:
-            color = self.colorList[i]
-            i += 1
-            if i == len(self.colorList):
-                i = 0
-            for s in sphereList:
-                sphere = self.v.sphere(pos=s.center, radius=s.radius/1000, color=color, opacity=0.2)
-                self.spheres.append(sphere)
+        colorForSource = {}
+        table = field.wavefronts
+        for center, radius, source in zip(table.centers, table.radius, table.source):
+            if source not in colorForSource:
+                colorForSource[source] = self.colorList[len(colorForSource) % len(self.colorList)]
+            color = colorForSource[source]
+            sphere = self.v.sphere(pos=tuple(center), radius=radius/1000, color=color, opacity=0.2)
+            self.spheres.append(sphere)
         
 
 
@@ -43,6 +44,13 @@ class PhysicalEnvironment(object):
         self.massScale = 1.0 
         self.forceScale = self.massScale*self.lengthScale
         self.fieldList = {}
+        self.geometryFrame = None # receiver geometry the fields share, remade every update
+        self.layoutVersion = 0 # bumped whenever the obstacles change, so fields know to drop what they cached
+        self.concurrentFields = False # update each field in a worker process of its own; set before adding fields
+        # don't wait for the field workers: their deliveries for one update arrive at the start of the next,
+        # while the devices compute and the next physics steps run
+        self.pipelineFields = False
+        self.fieldWorkers = {}
         self.dt = dt
 
         self.world.setGravity((0,-9.81*self.forceScale,0))
@@ -57,13 +65,25 @@ class PhysicalEnvironment(object):
     def addField(self, fieldName, f):
         self.fieldList[fieldName] = f
         f.environment = self
+        if self.concurrentFields and isinstance(f, Field):
+            self.fieldWorkers[fieldName] = FieldWorker(f)
 
     def addFieldObject(self, fieldName, o):
         # TODO: error behavior
         fieldInfo = self.fieldList[fieldName].addObject(o)
+        return fieldInfo # the object's receiver id in that field
+
+    def pushFieldEmission(self, fieldName, o, freq, power, t, data=None, position=None):
+        # for objects that push their emissions rather than being polled for them
+        self.fieldList[fieldName].pushEmission(o, freq, power, t, data, position)
+
+    def pushFieldEmissions(self, fieldName, o, freq, powers, times, positions=None):
+        # a batch at once, each from its own position if given
+        self.fieldList[fieldName].pushEmissions(o, freq, powers, times, positions)
 
     def addObstacle(self, obs):
         self.obstacleList.append(obs)
+        self.layoutVersion += 1
 
     def addObject(self, obj):
         # assumes body is already in our world, and collision geoms are in our space
@@ -91,12 +111,36 @@ class PhysicalEnvironment(object):
 
         
         oldTime = self.time
+        self.geometryFrame = GeometryFrame(oldTime)
+        # fields in workers only share the receiver positions, so they can all update at once
+        workerNames = sorted(self.fieldWorkers)
+        if self.pipelineFields:
+            # what the workers worked out for the last update, one step late
+            for name in workerNames:
+                self.fieldWorkers[name].deliver()
+        for name in workerNames:
+            self.fieldWorkers[name].send(oldTime, self.geometryFrame, self.obstacleList)
         #div = 1
-        for f in self.fieldList.values(): # TODO: make the fields into encapsualted 'physics objects'
+        for name, f in self.fieldList.items(): # TODO: make the fields into encapsualted 'physics objects'
             #for i in range(div):
                 #oldTime += crude_dt/div
+            if name not in self.fieldWorkers:
                 f.update(oldTime)
+        if not self.pipelineFields:
+            for name in workerNames:
+                self.fieldWorkers[name].deliver()
+
 
+    def closeFields(self):
+        # end of the run: the field workers deliver what they still hold, then stop, as do the fields' own workers
+        for name in sorted(self.fieldWorkers):
+            self.fieldWorkers[name].close()
+        self.fieldWorkers = {}
+        for f in self.fieldList.values():
+            try:
+                f.close()
+            except AttributeError:
+                pass # not every field has workers
 
     def near_callback(self, args, geom1, geom2):
         # Check if the objects do collide
@@ -198,6 +242,7 @@ class SimulationManager(PhysicalEnvironment, ComputeEnvironment):
         except KeyboardInterrupt:
             pass
         finally:
+            self.closeFields()
             # TODO: put this in cleanup function
             if self.visualizer is not None:
                 self.visualizer.canvas.window.delete_all()
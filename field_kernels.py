@@ -0,0 +1,131 @@
+"""Interchangeable implementations of the inner loops of a Field: advancing the wavefronts,
+   testing them against receivers, and summing interfering waves. Pick one by name with
+   getKernels, e.g. from <param backend="numba"/> on a <field>.
+"""
+import logging
+import numpy as np
+try:
+    import numba
+except ImportError:
+    numba = None
+
+class NumpyKernels(object):
+    """Whole-column numpy operations. The default."""
+    name = 'numpy'
+
+    def advance(self, columns, now, speed, transmittedFraction):
+        """ Move every front to its radius at time now, and update intensities under inverse-square decay.
+            Fronts that have reached their first reflecting surface keep transmittedFraction of their power. """
+        columns.wasActive[:] = ~np.isnan(columns.intensity)
+        columns.lastRadius[:] = columns.radius
+        columns.radius[:] = speed*(now - columns.t1)
+        columns.intensityFactor[:] = columns.baseFactor*np.where(columns.radius >= columns.reflectAt, transmittedFraction, 1.0)
+        moving = columns.radius > 0
+        r = columns.radius[moving]
+        columns.intensity[moving] = columns.power[moving]*columns.intensityFactor[moving]/(4*np.pi*r*r)
+
+    def crossings(self, columns, rows, positions, pos2, previous, prev2):
+        """ Which of the (row, receiver) pairs had the wavefront shell sweep over the receiver since
+            the last update. positions/previous hold each pair's receiver position now and at the last
+            update, with their squared norms in pos2/prev2. As with the old per-sphere distance cache,
+            the old distance only counts for fronts that were already active at the last update.
+            Returns the hit mask and the squared distances now. """
+        c = columns.centers[rows]
+        center2 = columns.center2[rows]
+        newDist = pos2 + center2 - 2*np.einsum('ij,ij->i', c, positions)
+        oldDist = prev2 + center2 - 2*np.einsum('ij,ij->i', c, previous)
+        oldDist = np.where(columns.wasActive[rows], oldDist, newDist)
+        r = columns.radius[rows]
+        lastR = columns.lastRadius[rows]
+        # image fronts can't reach anything nearer to them than the surface they were mirrored in
+        activation = columns.activation[rows]
+        return (r*r >= newDist) & (lastR*lastR < oldDist) & (newDist >= activation*activation), newDist
+
+    def interfere(self, intensity, radius, frequency, phaseShift):
+        """ Each wave as a complex amplitude: sqrt(intensity) at its phase on arrival """
+        intensity, radius, frequency, phaseShift = [np.asarray(a, dtype=np.float64) for a in (intensity, radius, frequency, phaseShift)]
+        return np.sqrt(intensity)*np.exp(1j*(2*np.pi*radius*frequency + phaseShift))
+
+
+# element-by-element loops: the reference implementation, and what numba compiles
+
+def _advanceLoop(t1, power, baseFactor, reflectAt, radius, lastRadius, intensityFactor, intensity, wasActive,
+                 now, speed, transmittedFraction):
+    for i in range(len(t1)):
+        wasActive[i] = not np.isnan(intensity[i])
+        lastRadius[i] = radius[i]
+        r = speed*(now - t1[i])
+        radius[i] = r
+        factor = baseFactor[i]
+        if r >= reflectAt[i]:
+            factor *= transmittedFraction
+        intensityFactor[i] = factor
+        if r > 0:
+            intensity[i] = power[i]*factor/(4*np.pi*r*r)
+
+def _crossingsLoop(centers, center2, radius, lastRadius, wasActive, activation, rows, positions, pos2, previous, prev2,
+                   hit, newDist):
+    for k in range(len(rows)):
+        i = rows[k]
+        towards = centers[i, 0]*positions[k, 0] + centers[i, 1]*positions[k, 1] + centers[i, 2]*positions[k, 2]
+        d = pos2[k] + center2[i] - 2*towards
+        old = d
+        if wasActive[i]:
+            towards = centers[i, 0]*previous[k, 0] + centers[i, 1]*previous[k, 1] + centers[i, 2]*previous[k, 2]
+            old = prev2[k] + center2[i] - 2*towards
+        newDist[k] = d
+        hit[k] = (radius[i]*radius[i] >= d) and (lastRadius[i]*lastRadius[i] < old) and (d >= activation[i]*activation[i])
+
+def _interfereLoop(intensity, radius, frequency, phaseShift, out):
+    for k in range(len(intensity)):
+        out[k] = np.sqrt(intensity[k])*np.exp(1j*(2*np.pi*radius[k]*frequency[k] + phaseShift[k]))
+
+
+class PythonKernels(object):
+    """Plain loops over the wavefronts, one at a time, like the original FieldSphere methods"""
+    name = 'python'
+    advanceLoop = staticmethod(_advanceLoop)
+    crossingsLoop = staticmethod(_crossingsLoop)
+    interfereLoop = staticmethod(_interfereLoop)
+
+    def advance(self, columns, now, speed, transmittedFraction):
+        self.advanceLoop(columns.t1, columns.power, columns.baseFactor, columns.reflectAt, columns.radius,
+                         columns.lastRadius, columns.intensityFactor, columns.intensity, columns.wasActive,
+                         float(now), float(speed), float(transmittedFraction))
+
+    def crossings(self, columns, rows, positions, pos2, previous, prev2):
+        rows = np.ascontiguousarray(rows, dtype=np.int64)
+        hit = np.empty(len(rows), dtype=np.bool_)
+        newDist = np.empty(len(rows), dtype=np.float64)
+        self.crossingsLoop(columns.centers, columns.center2, columns.radius, columns.lastRadius, columns.wasActive,
+                           columns.activation, rows, positions, pos2, previous, prev2, hit, newDist)
+        return hit, newDist
+
+    def interfere(self, intensity, radius, frequency, phaseShift):
+        intensity, radius, frequency, phaseShift = [np.asarray(a, dtype=np.float64) for a in (intensity, radius, frequency, phaseShift)]
+        out = np.empty(len(intensity), dtype=np.complex128)
+        self.interfereLoop(intensity, radius, frequency, phaseShift, out)
+        return out
+
+backends = {'python': PythonKernels, 'numpy': NumpyKernels}
+
+if numba is not None:
+    class NumbaKernels(PythonKernels):
+        """The same loops as PythonKernels, compiled by numba"""
+        name = 'numba'
+        advanceLoop = staticmethod(numba.njit(cache=True)(_advanceLoop))
+        crossingsLoop = staticmethod(numba.njit(cache=True)(_crossingsLoop))
+        interfereLoop = staticmethod(numba.njit(cache=True)(_interfereLoop))
+
+    backends['numba'] = NumbaKernels
+
+
+def getKernels(name='numpy'):
+    """ The kernels for a backend name; numba falls back to numpy if it isn't installed """
+    name = str(name).lower()
+    if name == 'numba' and name not in backends:
+        logging.getLogger('Quadsim').warning('numba is not installed, using the numpy field kernels')
+        name = 'numpy'
+    if name not in backends:
+        raise ValueError('Unknown field backend {}'.format(name))
+    return backends[name]()
@@ -1,17 +1,106 @@
 import gc
+import heapq
 import numpy as np
 import threading
 import Queue as queue
-from multiprocessing.pool import ThreadPool
 from collections import defaultdict
 import itertools as it
 from random import random
 import ode
+from wavefront_table import WavefrontTable
+from spatial_index import ReceiverGrid, obstacleBounds
+from image_sources import ReflectingSurfaces, ImageSourceTree, inRegion
+from time_wheel import TimeWheel
+from sharded_intersections import ShardedIntersector
+from field_kernels import getKernels
+from geometry_frame import GeometryFrame
+from ray_tracer import AxisAlignedBoxes, RayPathCache
+from link_budget import LinkTable
+from response_table import cachedTable, firstPlanes, pathAxes
 
 def fixPhase(a):
     return ( a + np.pi) % (2 * np.pi ) - np.pi
 
+class PayloadList(list):
+    """The payloads of several emissions that a field coalesced into one wavefront"""
+    pass
+
+def payloadList(data):
+    """ The payloads a wavefront carries, as a list """
+    if data is None:
+        return []
+    if isinstance(data, PayloadList):
+        return list(data)
+    return [data]
+
+class EmissionQueue(object):
+    """Emissions that their sources pushed to a field when they were written, in a min-heap
+       by start time. The field pops only the ones that are due, so sources with nothing to
+       send cost it nothing per step. Batches pushed at once (see pushBatch) are kept as sorted
+       arrays instead, and only turned into emissions as they come due."""
+    def __init__(self):
+        self._heap = [] # (t, tiebreak, source, freq, power, data, position)
+        self._count = it.count()
+        self._batches = [] # [next due, source, freq, powers, times, positions], times sorted
+
+    def __len__(self):
+        return len(self._heap) + sum(len(b[4]) - b[0] for b in self._batches)
+
+    def push(self, o, freq, power, t, data=None, position=None):
+        heapq.heappush(self._heap, (t, next(self._count), o, freq, power, data, position))
+
+    def pushBatch(self, o, freq, powers, times, positions=None):
+        """ Push arrays of the powers and times (and optionally positions, one row each) of many
+            emissions from o at one frequency. Emissions with no power are dropped. """
+        powers = np.asarray(powers, dtype=np.float64).ravel()
+        times = np.asarray(times, dtype=np.float64).ravel()
+        keep = powers > 0
+        if positions is not None:
+            positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)[keep]
+        powers = powers[keep]
+        times = times[keep]
+        if len(times) == 0:
+            return
+        order = np.argsort(times, kind='mergesort')
+        if positions is not None:
+            positions = positions[order]
+        self._batches.append([0, o, freq, powers[order], times[order], positions])
+
+    def pop(self, now):
+        """ Remove and return the (source, freq, power, t, data, position) of every emission due at
+            or before now, in order of t. position is None for emissions from wherever their source is. """
+        due = []
+        while len(self._heap) > 0 and self._heap[0][0] <= now:
+            t, _, o, freq, power, data, position = heapq.heappop(self._heap)
+            due.append((o, freq, power, t, data, position))
+        if len(self._batches) == 0:
+            return due
+        for batch in self._batches:
+            start, o, freq, powers, times, positions = batch
+            end = int(np.searchsorted(times, now, side='right'))
+            if end == start:
+                continue
+            batch[0] = end
+            if positions is None:
+                places = [None]*(end - start)
+            else:
+                places = [tuple(p) for p in positions[start:end].tolist()]
+            due.extend(zip([o]*(end - start), [freq]*(end - start), powers[start:end].tolist(),
+                           times[start:end].tolist(), [None]*(end - start), places))
+        self._batches = [b for b in self._batches if b[0] < len(b[4])]
+        due.sort(key=lambda e: e[3])
+        return due
+
+    def discardSource(self, o):
+        kept = [e for e in self._heap if e[2] is not o]
+        if len(kept) != len(self._heap):
+            heapq.heapify(kept)
+            self._heap = kept
+        self._batches = [b for b in self._batches if b[1] is not o]
+
 class FieldObject(object):
+    isStatic = False # static objects never move, so fields can schedule wave arrivals at them in advance
+    pushesEmissions = False # objects that push their emissions (see Field.pushEmission) aren't polled with getRadiatedValues
     def getPosition(self):
         pass
     def getRadiatedValues(self):
@@ -19,6 +108,14 @@ class FieldObject(object):
         return [(None, None, None)]
     def getMaxRadiatedValue(self):
         return None # DUNNO
+    def getVelocity(self):
+        return None # unknown, so fields can't predict when waves reach us
+    def getSensitivity(self):
+        return 0.0 # weakest intensity we register; fields don't deliver anything weaker
+    def getBand(self):
+        return None # frequency we listen on, or None for all of them
+    def getAddress(self):
+        return None # address semantic fields deliver to us by, or None to get everything
     def detectField(self, fieldValue):
         """Register any readings, if necessary. fieldvalue is a FieldSphere
            Return True if this wave was handled, False otherwise (and it may show up again) """
@@ -36,7 +133,6 @@ class FieldSphere(object):
         self.data = data
         self.t1 = startTime
         self.center_2 = sum([k*k for k in self.center])
-        self.obj_distances = {}
         self.speed = speed
         self.isPlanar = False
         self.frequency = frequency
@@ -48,97 +144,87 @@ class FieldSphere(object):
         self.reflect_limits = [[-np.inf, np.inf], [-np.inf, np.inf], [-np.inf, np.inf]] 
 
 
-    def reflectOffSurface(self, surf_coord, surf_at, surf_depth):
-        # first get the vector from our source to the surface
-        # so we can reflect ourselves on the other side of that
-        t = surf_depth
-
-
-        test_limits = self.reflect_limits[surf_coord]
-
-        if self.center[surf_coord] < surf_at:
-            if t<0 or t>self.radius:
-                return None
-        else:
-            if t>0 or -t>self.radius:
-                return None
-
-        if surf_at <= test_limits[0] or surf_at >= test_limits[1]:
-            # we did
-            return None
-
-        # update the reflection limits
-        if surf_at < self.center[surf_coord]:
-            # we won't reflect anywhere < this
-            test_limits[0] = surf_at
-        elif surf_at > self.center[surf_coord]:
-            test_limits[1] = surf_at
-        else:
-            return None # no edge reflections for now
-
-        reflectPos = list(self.center)
-        reflectPos[surf_coord] += 2*t
-
-        dt = t/self.frequency
-
-        reflected = FieldSphere(reflectPos, self.speed, self.frequency, self.totalPower, self.t1, self.data)
-        reflected.radius = self.radius
-        reflected.intensity = self.intensity
-        reflected.intensity_factor = 0.5
-        self.intensity_factor = 0.75
-        reflected.original = self
-        reflected.phaseShift = np.pi
-        reflected.reflect_limits = self.reflect_limits
-
-        return reflected
-
-    def prepareToDiscard(self, t):
-        self.lastRadius = self.radius
-        self.radius = self.speed*(t-self.t1)
-       
-        if self.radius > 0:
-            self.intensity = self.totalPower/(4*np.pi*self.radius*self.radius)
-            self.intensity *= self.intensity_factor
-
-
-    def calculate(self, obj, obj_pos, obj_pos_sq):
-        x1, y1, z1 = self.center
-        x,y,z = obj_pos
-
-        order2 = 2*x*x1 + 2*y*y1 + 2*z*z1
-       
-        newDist = obj_pos_sq + self.center_2 - order2
-        oldDist = self.obj_distances.get(obj, newDist)
-
-        self.obj_distances[obj] = newDist
-
-        if (self.radius*self.radius >= newDist) and (self.lastRadius*self.lastRadius < oldDist):
-            return True
-        return False
-
     @classmethod
-    def copyAtT(cls, oldS, t, speed):
-        newS =  cls(oldS.center, oldS.speed, oldS.frequency, oldS.totalPower, oldS.t1)
-        newS.radius = speed*(t-oldS.t1)
-        newS.phaseShift = oldS.phaseShift
-        newS.data = oldS.data
-        newS.original = oldS.original
+    def fromTable(cls, table, i, t, speed, factor=None):
+        """ The front in row i of a WavefrontTable, as it is at time t. factor overrides the row's current intensity factor """
+        newS = cls(table.centers[i], speed, table.frequency[i], table.power[i], table.t1[i], table.data[i])
+        newS.radius = speed*(t-table.t1[i])
+        newS.phaseShift = table.phaseShift[i]
         if newS.radius > 0:
             newS.intensity = newS.totalPower/(newS.radius*newS.radius)
-            newS.intensity *= oldS.intensity_factor
+            newS.intensity *= table.intensityFactor[i] if factor is None else factor
 
         return newS
 
+class RayPool(object):
+    """ODE rays that live in one space for the whole run and get re-aimed every update,
+       instead of being allocated and freed in the hot path. Rays not handed out are disabled,
+       so collisions skip them."""
+    def __init__(self):
+        self.space = ode.HashSpace()
+        self.rays = []
+        self.inUse = 0
+
+    def __len__(self):
+        return self.inUse
+
+    def reset(self):
+        for ray in self.rays[:self.inUse]:
+            ray.disable()
+        self.inUse = 0
+
+    def aim(self, origin, direction, length, emission, power, travelled=0.0):
+        '''emission is (where it came from, t, power, radius already delivered), power what is left
+           of the emission's after reflections, and travelled how far the ray's front got to origin'''
+        if self.inUse == len(self.rays):
+            self.rays.append(ode.GeomRay(self.space, length))
+        ray = self.rays[self.inUse]
+        self.inUse += 1
+        ray.setLength(length)
+        ray.set(origin, direction)
+        ray.emission = emission
+        ray.power = power
+        ray.travelled = travelled
+        ray.enable()
+        return ray
+
 class RayField(object):
-    def __init__(self, propSpeed, minIntensity=1e-10):
-        self.objects = {}
+    nReflections = 2
+    receiverSize = 0.1 # edge of the box around receivers that have no collision geometry
+    def __init__(self, propSpeed, minIntensity=1e-10, dPhi=90, dTheta=90, tracer='ode'):
+        self.objects = {} # object -> [(t, power, origin, reached)] of its emissions still strong enough to trace,
+                          # origin None for where it is, and reached the radius delivered up to so far
+        self.emitters = {} # the same, for sources that push emissions without being in the field
         self.speed = float(propSpeed)
-        self.minI = minIntensity
-        self.dPhi = 5
-        self.dTheta = 5
+        self.minI = float(minIntensity)
+        # angular spacing of the rays, in degrees. Each ray goes through the middle of its patch, so
+        # 90 by 90 gives one per octant, though not along the cube diagonals the original 8 took
+        self.dPhi = float(dPhi)
+        self.dTheta = float(dTheta)
+        self.directions = self._rayDirections()
         self.environment = None
         self.objectLookup = {} # TODO: empty this at intervals?
-        #self.raySpace = ode.HashSpace()
+        self.emissionQueue = EmissionQueue()
+        self.rayPools = None # one per generation of rays: the emitted ones, then each round of reflections
+        # 'ode' collides every ray with every geom; 'numpy' traces all the rays against the
+        # obstacle and receiver boxes at once, and the nearest obstacle stops (and reflects) a ray
+        self.tracer = str(tracer).lower()
+        if self.tracer not in ('ode', 'numpy'):
+            raise ValueError('Unknown ray tracer {}'.format(tracer))
+        self._obstacleBoxes = None
+        self._layoutKey = None
+        self.pathCache = RayPathCache(self.directions, self.nReflections - 1)
+        self._placedEmitters = set() # (source, origin) the path cache holds paths from
+
+    def _rayDirections(self):
+        '''Unit vectors through the middle of each dTheta by dPhi patch of the sphere'''
+        thetas = np.radians(np.arange(self.dTheta/2.0, 180, self.dTheta))
+        phis = np.radians(np.arange(self.dPhi/2.0, 360, self.dPhi))
+        theta, phi = np.meshgrid(thetas, phis, indexing='ij')
+        theta = theta.ravel()
+        phi = phi.ravel()
+        directions = np.column_stack((np.sin(theta)*np.cos(phi), np.sin(theta)*np.sin(phi), np.cos(theta)))
+        return [tuple(float(x) for x in d) for d in directions]
 
     def addObject(self, o):
         self.objects[o] = []
@@ -149,24 +235,27 @@ class RayField(object):
 
     def removeObject(self, o):
         self.objects.pop(o, None)
+        self.emissionQueue.discardSource(o)
+        self.pathCache.forget(o)
 
-    def createRaysForObject(self, origin, emissionTimes, now, space):
-        rayList = []
-
-        # for now, just generate 8 rays:
-        # radiating to cube corners
-        directions = [(1,1,1), (-1,-1,-1), (1,1,-1), (-1,-1,1), (1,-1,1), (-1,1,-1), (-1, 1,1), (1, -1, -1)]
-        for et in emissionTimes:
-            for d in directions:
-                (t,pw) = et
-                radius = self.speed*(now-t)
-                newRay = ode.GeomRay(space, radius)
-                newRay.set(origin, d)
-                newRay.intensity = pw
-                #newRay = FieldRay(radius,  origin, d, pw, space)
-                rayList.append(newRay)
-        
-        return rayList
+    def pushEmission(self, o, freq, power, t, data=None, position=None):
+        if freq is None or power is None or freq <= 0 or power <= 0:
+            return
+        self.emissionQueue.push(o, freq, power, t, data, position)
+
+    def pushEmissions(self, o, freq, powers, times, positions=None):
+        if freq is None or freq <= 0:
+            return
+        self.emissionQueue.pushBatch(o, freq, powers, times, positions)
+
+    def createRaysForObject(self, origin, emissionTimes, now, pool):
+        for t, pw, at, reached in emissionTimes:
+            radius = self.speed*(now-t)
+            if radius <= reached:
+                continue
+            start = origin if at is None else at
+            for d in self.directions:
+                pool.aim(start, d, radius, (start, t, pw, reached), pw)
 
     def findSensorForObject(self, o):
         if o not in self.objectLookup:
@@ -178,10 +267,19 @@ class RayField(object):
                     break
         return self.objectLookup.get(o)
 
-    def handleReflectionForRays(self, rayContacts):
+    def detection(self, position, t, power, d):
+        '''What a receiver d along a ray path from an emission of power at position and time t picks up'''
+        value = FieldSphere(position, self.speed, 0, power, t)
+        value.radius = d
+        value.tArr = t + d/self.speed
+        value.intensity = power/(4*np.pi*d*d) if d > 0 else np.inf
+        return value
+
+    def handleReflectionForRays(self, rayContacts, pool):
+        '''Aim the reflections of the rays that hit obstacles from pool (unless it is None), and
+           return what the sensors the rays hit pick up. Only hits the fronts got to since the
+           last update count, since the rays are aimed their full length every update.'''
         # determine if we are making more reflections, and if there are intersections with objects
-        newRayList = []
-        newRaySpace = ode.HashSpace()
         intersectionList = defaultdict(list)
         for ray, contactList in rayContacts.items():
             for contact in contactList:
@@ -192,77 +290,160 @@ class RayField(object):
                 if sensor is not None:
                     # don't be intersected by rays coming from us...
                     if ray.getPosition() != sensor.getPosition():
-                        intersectionList[sensor].append(ray)
-                else:
-                    try:
-                        if obj.isObstacle:
-                            # reflect
-                            reflectDir = normal
-                            reflectFrom = pos
-                            newLength = ray.getLength() - depth
-                            newRay = ode.GeomRay(newRaySpace, newLength)
-                            newRay.set(reflectFrom, reflectDir)
-                            newRay.intensity = ray.intensity
-                            newRayList.append(newRay)
-                    except AttributeError:
-                        pass
-                    # is it an obstacle?
-
-        return newRayList, newRaySpace, intersectionList
+                        start, t, power, reached = ray.emission
+                        d = ray.travelled + depth
+                        if d > reached:
+                            intersectionList[sensor].append(self.detection(start, t, ray.power, d))
+                elif pool is not None and getattr(obj, 'isObstacle', False):
+                    # reflect
+                    reflectDir = normal
+                    newLength = ray.getLength() - depth
+                    if newLength > 0:
+                        pool.aim(pos, reflectDir, newLength, ray.emission, ray.power*self.pathCache.reflectedFraction,
+                                 ray.travelled + depth)
+
+        return intersectionList
 
     def update(self, now):
-        allObjects = self.objects.iterkeys()
-        raySpace = ode.HashSpace()
-        allRays = []
-        worldSpace = None
-        self.currentRayContacts = defaultdict(list)
-        for o in allObjects:
-            emissionTimes = self.objects[o]
-            keptTimes = []
- 
-            # remove emissions that fall below our minimum intensity
-            for (t, power) in emissionTimes:
-                distance = self.speed*(now-t)
-                intensity = power / (4*np.pi*distance*distance)
-                if intensity >= self.minI:
-                    keptTimes.append(t,intensity)
+        if len(self.objects) == 0:
+            return
+        pool = None
+        if self.tracer == 'ode':
+            if self.rayPools is None:
+                self.rayPools = [RayPool() for _ in range(self.nReflections)]
+            for pool in self.rayPools:
+                pool.reset()
+            pool = self.rayPools[0]
+        pushed = defaultdict(list)
+        for o, freq, power, t, data, position in self.emissionQueue.pop(now):
+            pushed[o].append((freq, power, t, position))
+            if o not in self.objects:
+                self.emitters.setdefault(o, [])
+        for o in list(self.objects) + list(self.emitters):
+            kept = self.objects if o in self.objects else self.emitters
+            keptTimes = list(kept[o])
 
             # add new emissions if any
-            allNew = o.getRadiatedValues()
+            if kept is self.emitters or o.pushesEmissions:
+                allNew = pushed[o]
+            else:
+                allNew = o.getRadiatedValues()
             for info in allNew:
-                if info is None or info[0] <= 0 or info[1] <= 0:
+                if info is None or info[0] is None or info[0] <= 0 or info[1] <= 0:
                     continue
-                freq, power, t = info
-                keptTimes.append((t, power)) # we will deal with freq later when basic raycasting works
+                freq, power, t = info[:3]
+                origin = info[3] if len(info) > 3 else None
+                keptTimes.append((t, power, origin, 0.0)) # we will deal with freq later when basic raycasting works
 
             # new list of emissions is complete
-            emissionTimes = keptTimes
+            kept[o] = keptTimes
+
+            # aim the rays
+            if self.tracer == 'ode':
+                self.createRaysForObject(o.getPosition(), keptTimes, now, pool)
 
-            # create the rays
-            rayList = self.createRaysForObject(o.getPosition(), emissionTimes, now, raySpace)
-            allRays += rayList
+        if self.tracer == 'numpy':
+            self.traceAll(now)
+        else:
+            self.traceWithOde(pool)
 
-            # all objects should be in the same world, so grab the space
-            if worldSpace is None:
-                worldSpace = o.environment.space
+        # the fronts have been delivered up to where they are now, so remove the emissions
+        # that are already too weak there to be picked up by anything further out
+        for kept in (self.objects, self.emitters):
+            for o, keptTimes in kept.items():
+                stillGoing = []
+                for t, power, origin, reached in keptTimes:
+                    distance = self.speed*(now-t)
+                    if distance <= 0 or power/(4*np.pi*distance*distance) >= self.minI:
+                        stillGoing.append((t, power, origin, max(distance, reached)))
+                kept[o] = stillGoing
+        for o in [o for o, keptTimes in self.emitters.items() if len(keptTimes) == 0]:
+            del self.emitters[o]
 
-        nReflections = 2
+    def traceWithOde(self, pool):
+        '''Collide the rays aimed from pool, and their reflections, with the world, and deliver what they hit'''
+        # all objects should be in the same world
+        worldSpace = self.environment.space
         allIntersections = defaultdict(list)
-        for _ in range(nReflections):
+        for n in range(self.nReflections):
+            if len(pool) == 0:
+                break
             # perform the ray-object intersections
-            ode.collide2(raySpace, worldSpace, None, self._rayCollideCallback)
-            if len(self.currentRayContacts) > 0:
-                newRayList, raySpace, newIntersections = self.handleReflectionForRays(self.currentRayContacts)
-            else:
+            self.currentRayContacts = defaultdict(list)
+            ode.collide2(pool.space, worldSpace, None, self._rayCollideCallback)
+            if len(self.currentRayContacts) == 0:
                 break #no reflections or intersections means we are done
+            reflected = self.rayPools[n+1] if n+1 < self.nReflections else None
+            newIntersections = self.handleReflectionForRays(self.currentRayContacts, reflected)
+            pool = reflected
             # add in the newInterstections
             for k,v in newIntersections.items():
                 allIntersections[k] += v
         # ok, we're done, now to handle interference and sensing
-        for sensor, rays in allIntersections.items():
-            chosen = rays[0]
-            sensor.detectField(chosen)
+        for sensor, values in allIntersections.items():
+            if len(values) == 0:
+                continue
+            values.sort(key=lambda v: v.radius)
+            sensor.detectField(self.combineValues(values))
+
 
+    def _receiverBox(self, o):
+        '''Bounding box of the geoms of o's device, or a small box around o if it has none'''
+        device = getattr(o, 'device', o)
+        geoms = getattr(device, 'geomList', None) or []
+        if len(geoms) == 0:
+            p = np.asarray(o.getPosition(), dtype=np.float64)
+            return p - self.receiverSize/2, p + self.receiverSize/2
+        aabb = np.array([g.getAABB() for g in geoms], dtype=np.float64)
+        return aabb[:, ::2].min(axis=0), aabb[:, 1::2].max(axis=0)
+
+    def obstacleBoxes(self):
+        obstacles = self.environment.obstacleList
+        layoutKey = (getattr(self.environment, 'layoutVersion', None), len(obstacles))
+        if self._layoutKey != layoutKey:
+            self._obstacleBoxes = AxisAlignedBoxes.fromObstacles(obstacles)
+            self._layoutKey = layoutKey
+        return self._obstacleBoxes
+
+    def traceAll(self, now):
+        '''Deliver what the rays of every kept emission reach, with the numpy tracer. The paths come
+           from the path cache, so only emitters that moved (or got louder) are traced again, and
+           each update just scales the cached hits by the emissions' power, and delivers the ones
+           their fronts got to since the last update.'''
+        obstacles = self.obstacleBoxes()
+        objList = list(self.objects)
+        boxes = [self._receiverBox(o) for o in objList]
+        byReceiver = defaultdict(list)
+        # emissions from where their source is are traced from the source, the ones pushed with
+        # a position of their own from each place they came from
+        emitters = defaultdict(list)
+        for o in objList + list(self.emitters):
+            for t, power, origin, reached in self.objects.get(o, self.emitters.get(o)):
+                if now > t:
+                    emitters[o if origin is None else (o, origin)].append((t, power, reached))
+        placed = set(k for k in emitters if isinstance(k, tuple))
+        for key in self._placedEmitters - placed:
+            self.pathCache.forget(key) # nothing left to trace from there
+        self._placedEmitters = placed
+        for key, emissions in emitters.items():
+            reach = self.speed*(now - min(e[0] for e in emissions))
+            if self.minI > 0:
+                # as far as the loudest of them can be heard, so the paths last its whole life
+                loudest = max(e[1] for e in emissions)
+                reach = max(reach, np.sqrt(loudest/(4*np.pi*self.minI)))
+            position = key[1] if key in placed else key.getPosition()
+            self.pathCache.pathsFrom(key, position, reach, obstacles, self._layoutKey)
+            for j, receiver in enumerate(objList):
+                hits = self.pathCache.hitsOn(key, receiver, boxes[j][0], boxes[j][1])
+                if len(hits) == 0:
+                    continue
+                for t, power, reached in emissions:
+                    first, last = np.searchsorted(hits.distance, [reached, self.speed*(now-t)], side='right')
+                    for k in range(first, last):
+                        byReceiver[j].append(self.detection(position, t, power*hits.power[k], hits.distance[k]))
+        for j, values in sorted(byReceiver.items()):
+            values.sort(key=lambda v: v.radius)
+            objList[j].detectField(self.combineValues(values))
 
     def _rayCollideCallback(self, args, geom1, geom2):
         contacts = ode.collide(geom1, geom2)
@@ -274,158 +455,743 @@ class RayField(object):
             self.currentRayContacts[theRay]+=(contacts)
 
     def combineValues(self, rayList):
-        return sphereList[0]
-             
+        return rayList[0]
+
 class Field(object):
-    sharedThreadPool = ThreadPool(4) 
-    def __init__(self, propSpeed, minI=1e-10, planeEquation=None):
-        # TODO: replace with sphereList, mapping sphere to producing object
-        self.objects = {}
+    speedBoundMargin = 2.0 # receivers are assumed to move at most this many times faster than they were last seen moving
+    minSpeedBound = 0.1
+    transmittedFraction = 0.75 # of a front's power, once it has reflected off a surface
+    bandWidth = 1e6 # receivers only hear wavefronts in their own band (e.g. radio channel)
+    sumsInterference = False # True if combineValues adds up every hit, so ones too weak to register alone still count
+    def __init__(self, propSpeed, minI=1e-10, planeEquation=None, reflectionOrder=1, workers=0, backend='numpy',
+                 coalesceWindow=0.0, maxWavefronts=0, linkTolerance=0.0):
+        self.objects = {} # object -> dense receiver id; the emitted wavefronts themselves live in self.wavefronts
+        self._polledObjects = [] # objects that don't push their emissions
+        self.emissionQueue = EmissionQueue() # emissions pushed by the rest
+        self._freeIds = [] # heap of ids given up by removed objects
         self.speed = float(propSpeed)
         self.minI = minI
         self.planeEq = planeEquation
+        self.reflectionOrder = int(reflectionOrder)
+        self.kernels = getKernels(backend) # python, numpy or numba
+        self.wavefronts = WavefrontTable(kernels=self.kernels)
+        self.receiverGrids = {} # moving receivers only, one grid per band
+        self.surfaces = None
+        self._layoutObstacleCount = None
+        self._lastPositions = {}
+        self.arrivals = [] # heap of (arrival time, wavefront id, tiebreak, static receiver)
+        self._arrivalCount = it.count()
+        self._speedBounds = {}
+        self._lastUpdateTime = None
+        self.expiries = None # TimeWheel of wavefront ids, by when they decay below minI
+        self._expiring = []
+        self._layoutBounds = None
+        self.floorSensitivity = np.inf # lowest sensitivity of any receiver we have had
+        self.intersector = ShardedIntersector(workers, self.kernels) # worker processes for the wavefront/receiver tests
+        # emissions from one source within this many seconds of each other share a wavefront
+        self.coalesceWindow = float(coalesceWindow)
+        self._pendingEmissions = {} # (source, band) -> emission still open to coalescing
+        # most wavefronts to track at once (0 for no limit); see enforceBudget
+        self.maxWavefronts = int(maxWavefronts)
+        self.droppedWavefronts = 0
+        self.geometry = GeometryFrame() # receiver positions this update, shared with co-located fields
+        # when delivering instantly, keep each emitter-receiver link until an end moves this far (0 to always recompute)
+        self.links = None
+        if float(linkTolerance) > 0:
+            self.links = LinkTable(linkTolerance)
 
     def addObject(self, o):
-        self.objects[o] = []
+        '''Returns the object's receiver id: stable while it is in the field, and dense, so that
+           per-receiver state can live in arrays'''
+        if o in self.objects:
+            return self.objects[o]
+        if len(self._freeIds) > 0:
+            receiverId = heapq.heappop(self._freeIds)
+            self.wavefronts.resetPairSlot(receiverId)
+        else:
+            receiverId = len(self.objects)
+            self.wavefronts.reservePairSlots(receiverId+1)
+        self.objects[o] = receiverId
+        if not o.pushesEmissions:
+            self._polledObjects.append(o)
+        # fronts already filed keep their expiry, so a more sensitive late-comer only hears newer ones
+        self.floorSensitivity = min(self.floorSensitivity, self.receiverSensitivity(o))
+        if o.isStatic and len(self.wavefronts) > 0:
+            # catch the wavefronts already in flight that have yet to reach it
+            self._scheduleArrivals(slice(0, len(self.wavefronts)), [o], True)
+        return receiverId
 
     def removeObject(self, o):
-        self.objects.pop(o, None)
+        receiverId = self.objects.pop(o, None)
+        if receiverId is not None:
+            heapq.heappush(self._freeIds, receiverId)
+            if not o.pushesEmissions:
+                self._polledObjects.remove(o)
+        self.emissionQueue.discardSource(o)
+        self._lastPositions.pop(o, None)
+        self._speedBounds.pop(o, None)
+        for key in [k for k in self._pendingEmissions if k[0] is o]:
+            del self._pendingEmissions[key]
+        if self.links is not None:
+            self.links.forget(o)
+
+    def memoryUsage(self):
+        '''What the field is holding on to, for profiling'''
+        return {'wavefronts': len(self.wavefronts),
+                'wavefrontBytes': self.wavefronts.nbytes(),
+                'receivers': len(self.objects),
+                'pendingArrivals': len(self.arrivals),
+                'pendingExpiries': len(self.expiries or ()),
+                'droppedWavefronts': self.droppedWavefronts}
+
+    def _scheduleArrivals(self, rows, staticObjects, onlyAhead=False):
+        '''Push the arrival time of each wavefront in rows at each static receiver onto the arrival queue'''
+        if len(staticObjects) == 0:
+            return
+        table = self.wavefronts
+        geometry = self.geometry
+        if onlyAhead:
+            geometry = GeometryFrame() # added between updates, so where it is now
+        frameRows = geometry.locate(staticObjects)
+        distances = np.sqrt(geometry.squaredDistances(table.centers[rows], frameRows))
+        arrivals = table.t1[rows][:, None] + distances/self.speed
+        ids = table.ids[rows]
+        sources = table.source[rows]
+        direct = table.parent[rows] < 0
+        # never schedule what the receiver can't register, even before any reflection
+        sensitivity = np.array([self.receiverSensitivity(o) for o in staticObjects])
+        reaches = (table.power[rows]*table.baseFactor[rows])[:, None] >= sensitivity[None, :]*distances*distances
+        reaches &= self._inBand(table.band[rows], [self.receiverBand(o) for o in staticObjects])
+        # an image front is only physical beyond its activation radius, as for moving receivers
+        reaches &= distances >= table.activation[rows][:, None]
+        reaches &= inRegion(geometry.positions(frameRows), table.regionLow[rows], table.regionHigh[rows]).T
+        if onlyAhead:
+            reaches &= distances > table.radius[rows][:, None]
+        for i, j in zip(*np.nonzero(reaches)):
+            o = staticObjects[j]
+            if direct[i] and sources[i] is o:
+                continue # a wavefront never hits the object that emitted it (but may hit it on the rebound)
+            heapq.heappush(self.arrivals, (arrivals[i, j], ids[i], next(self._arrivalCount), o))
+
+    def _collectArrivals(self, now, intersectionsByObject):
+        due = []
+        while len(self.arrivals) > 0 and self.arrivals[0][0] <= now:
+            due.append(heapq.heappop(self.arrivals))
+        if len(due) == 0:
+            return
+        table = self.wavefronts
+        rows = table.rowsForIds([e[1] for e in due])
+        byObject = defaultdict(list)
+        for (tArr, _, _, o), i in zip(due, rows):
+            # the wavefront may have decayed away, or the receiver left, before it got there
+            if i >= 0 and o in self.objects:
+                byObject[o].append((i, tArr))
+        for o, arrivals in byObject.items():
+            sensitivity = self.receiverSensitivity(o)
+            for i, tArr in sorted(arrivals):
+                r = self.speed*(tArr - table.t1[i])
+                if table.power[i]*table.intensityFactor[i] < sensitivity*r*r:
+                    continue # it got weaker reflecting off something on the way
+                intersectionsByObject[o].append((table, i, tArr, None))
+
+    def _checkLayout(self):
+        obstacles = self.environment.obstacleList
+        if self._layoutObstacleCount != len(obstacles):
+            self.surfaces = ReflectingSurfaces(obstacles)
+            self.receiverGrids = {}
+            self._layoutBounds = obstacleBounds(obstacles)
+            self._layoutObstacleCount = len(obstacles)
+
+    def propagatesInstantly(self):
+        '''True if every wavefront, echoes included, crosses the whole layout (and every receiver
+           we last saw) within one update, so there is no point tracking it from step to step'''
+        self._checkLayout()
+        points = list(self._lastPositions.values())
+        if self._layoutBounds is not None:
+            points.extend(self._layoutBounds)
+        if len(points) == 0:
+            return False # nothing to go on yet
+        points = np.array(points, dtype=np.float64)
+        diameter = np.linalg.norm(points.max(axis=0) - points.min(axis=0))
+        # an image reflected n times is at most 2n diameters further out than its source
+        longestPath = diameter*(2*max(self.reflectionOrder, 0) + 1)
+        return longestPath/self.speed < self.environment.dt
+
+    def bandOf(self, frequency):
+        '''Band index of each frequency'''
+        return np.rint(np.asarray(frequency, dtype=np.float64)/self.bandWidth).astype(np.int64)
+
+    def close(self):
+        '''Stop the intersector's worker processes, if it started any'''
+        self.intersector.close()
+
+    def receiverSensitivity(self, o):
+        '''Weakest intensity worth delivering to o on its own: its sensitivity, or 0 if we sum
+           interference, since waves too weak to register still add to the ones that do'''
+        if self.sumsInterference:
+            return 0.0
+        return o.getSensitivity()
+
+    def receiverBand(self, o):
+        '''Band o listens on, or None if it hears every band'''
+        band = o.getBand()
+        if band is None:
+            return None
+        return int(self.bandOf(band))
+
+    def _inBand(self, rowBands, receiverBands):
+        '''Which (row, receiver) pairs share a band. receiverBands is a list, with None for any band'''
+        listens = np.array([b is not None for b in receiverBands], dtype=bool)
+        bands = np.array([-1 if b is None else b for b in receiverBands], dtype=np.int64)
+        return (rowBands[:, None] == bands[None, :]) | ~listens[None, :]
+
+    def _updateSpeedBounds(self, objList, displacement, now):
+        '''Upper bound on the speed of each receiver, used to predict the earliest time a wavefront can reach it'''
+        elapsed = None
+        if self._lastUpdateTime is not None:
+            elapsed = now - self._lastUpdateTime
+        self._lastUpdateTime = now
+        bounds = np.empty(len(objList))
+        for j, o in enumerate(objList):
+            v = self.geometry.velocity(o)
+            speed = np.inf if v is None else np.linalg.norm(v)
+            if elapsed:
+                speed = max(speed, displacement[j]/elapsed) # catches teleports, too
+            bound = self._speedBounds.get(o, 0.0)
+            if speed > bound:
+                # it moved faster than we planned for, so none of its pending predictions hold
+                bound = max(speed*self.speedBoundMargin, self.minSpeedBound)
+                self._speedBounds[o] = bound
+                self.wavefronts.resetPairSlot(self.objects[o])
+            bounds[j] = bound
+        return bounds
 
-    def _sphereGenerator(self):
-        for sphereList in self.objects.itervalues():
-            for s in sphereList:
-                yield s
-
-    def _intersectionThreaded(self, args):
-        s = args[0]
-        info = args[1]
-        intersectInfo = {}
-        if s.intensity is not None:
-            for o in self.objects:
-                objInfo = info[o]
-                if s.calculate(o, objInfo[0], objInfo[1]):
-                    dPos = np.subtract(objInfo[0], s.center)
-                    dt = np.linalg.norm(dPos)/self.speed
-                    properCopy = FieldSphere.copyAtT(s, s.t1+dt, self.speed)
-                    properCopy.tArr = s.t1+dt
-                    intersectInfo[o] = properCopy
-        return intersectInfo
-
-    def performIntersections(self, t):
-        '''We need to go through all spheres and find intersections between objects and spheres with radius>0'''
-        # assumes waaay more spheres than objects
-        # TODO: octree or other representation to limit comparisons
-
-        extraSpheres = self.intersectObstacles(self.environment.obstacleList)
+    def _predictArrivals(self, table, pairRows, pairReceivers, pairSlots, distances, speedBounds, now):
+        '''Conservative advancement: a front can reach a receiver no sooner than if the
+           receiver headed straight for it at its speed bound'''
+        r = table.radius[pairRows]
+        bound = speedBounds[pairReceivers]
+        ahead = distances > r
+        # once inside a front, a receiver slower than the front can never cross it again
+        nextCheck = np.where(bound < self.speed, np.inf, now)
+        nextCheck[ahead] = now + (distances[ahead] - r[ahead])/(self.speed + bound[ahead])
+        table.setPairValues(pairRows, pairSlots, nextCheck)
 
+    def _collectIntersections(self, table, grid, receivers, positions, pos2, previous, prev2, sensitivity,
+                              intersectionsByObject, excludeSources, now=None, speedBounds=None, rowMask=None, slots=None):
+        active = table.hasIntensity()
+        if rowMask is not None:
+            active &= rowMask
+        rows = np.flatnonzero(active)
+        if len(rows) == 0:
+            return
+        pairRows, pairReceivers, hit, newDist = self.intersector.run(table, grid, rows, positions, pos2, previous, prev2,
+                                                                     sensitivity, None if speedBounds is None else slots, now)
+        if speedBounds is not None:
+            self._predictArrivals(table, pairRows, pairReceivers, slots[pairReceivers], np.sqrt(np.maximum(newDist, 0)),
+                                  speedBounds, now)
+        if excludeSources:
+            # a wavefront never hits the object that emitted it (but may hit it on the rebound)
+            hit &= (table.source[pairRows] != receivers[pairReceivers]) | (table.parent[pairRows] >= 0)
+        # an image front only exists on the source's side of the planes it was mirrored in
+        at = positions[pairReceivers]
+        hit &= ((at >= table.regionLow[pairRows]) & (at <= table.regionHigh[pairRows])).all(axis=1)
+        pairRows = pairRows[hit]
+        pairReceivers = pairReceivers[hit]
+        order = np.lexsort((pairRows, pairReceivers))
+        for i, j in zip(pairRows[order], pairReceivers[order]):
+            dt = np.linalg.norm(positions[j] - table.centers[i])/self.speed
+            intersectionsByObject[receivers[j]].append((table, i, table.t1[i]+dt, None))
 
+    def _deliverInstantly(self, table, receivers, frameRows, sensitivity, intersectionsByObject, links=None):
+        '''Deliver the wavefronts in table to every receiver they reach, straight from the pairwise
+           distances. For fields fast enough that a front crosses everything within one update.'''
+        if len(table) == 0 or len(receivers) == 0:
+            return
+        if links is None:
+            d2 = self.geometry.squaredDistances(table.centers, frameRows)
+        else:
+            ids = np.array([self.objects[o] for o in receivers], dtype=int)
+            d2 = self.links.squaredDistances(links, ids, self.geometry.positions(frameRows))
+        factor = table.baseFactor[:, None]*np.where(d2 >= table.reflectAt[:, None]**2, self.transmittedFraction, 1.0)
+        # same reach as a tracked front: it must be physical there
+        hit = d2 >= table.activation[:, None]**2
+        hit &= inRegion(self.geometry.positions(frameRows), table.regionLow, table.regionHigh).T
+        hit &= table.power[:, None]*factor >= sensitivity[None, :]*d2
+        hit &= self._inBand(table.band, [self.receiverBand(o) for o in receivers])
+        hit &= (table.source[:, None] != receivers[None, :]) | (table.parent[:, None] >= 0)
+        pairRows, pairReceivers = np.nonzero(hit)
+        order = np.lexsort((pairRows, pairReceivers))
+        for i, j in zip(pairRows[order], pairReceivers[order]):
+            tArr = table.t1[i] + np.sqrt(d2[i, j])/self.speed
+            intersectionsByObject[receivers[j]].append((table, i, tArr, factor[i, j]))
+
+    def performIntersections(self, t, instantFronts=None, instantLinks=None):
+        '''We need to go through all spheres and find intersections between objects and spheres with radius>0.
+           instantFronts holds new wavefronts that reach every receiver within this update, and
+           instantLinks their emitters' entries in the link table, if there is one.'''
         # precalculate obj. info
-        objInfoTable = {}
-        for o in self.objects:
-            pos = o.getPosition()
-            pos2 = sum([k*k for k in pos])
-            objInfoTable[o] = (pos, pos2)
-
-        repeatInfo = it.repeat(objInfoTable)
-        origSpheresList = self._sphereGenerator()
-        allSpheresList = it.chain(origSpheresList, extraSpheres)
-        together = it.izip(allSpheresList, repeatInfo)
-        allIntersections = it.imap(self._intersectionThreaded, together)
-        #allIntersections = self.sharedThreadPool.imap_unordered(self._intersectionThreaded, together, 16)
-        # now take the collisions and order them by object
+        objList = list(self.objects)
+        receivers = np.empty(len(objList), dtype=object)
+        for j, o in enumerate(objList):
+            receivers[j] = o
+        frameRows = self.geometry.locate(objList)
+        positions = self.geometry.positions(frameRows)
+        pos2 = self.geometry.squaredNorms(frameRows)
+        previous = np.array([self._lastPositions.get(o, p) for o, p in zip(objList, positions)], dtype=np.float64).reshape(-1, 3)
+        prev2 = np.einsum('ij,ij->i', previous, previous)
+        self._lastPositions = dict(zip(objList, positions))
+        moving = np.array([not o.isStatic for o in objList], dtype=bool)
+        slots = np.array([self.objects[o] for o in objList], dtype=int)
+        sensitivity = np.array([self.receiverSensitivity(o) for o in objList], dtype=np.float64)
+        displacement = np.linalg.norm(positions - previous, axis=1)
+        self._checkLayout()
+        speedBounds = np.zeros(len(objList))
+        speedBounds[moving] = self._updateSpeedBounds(receivers[moving], displacement[moving], t)
+        # receivers only get tested against the wavefronts in their band
+        bandMembers = defaultdict(list)
+        for j, o in enumerate(objList):
+            if moving[j]:
+                bandMembers[self.receiverBand(o)].append(j)
+
+        # now take the collisions and order them by object; the copies only get made on delivery
         intersectionsByObject = defaultdict(list)
-        for intersect in allIntersections:
-            for o in intersect:
-                intersectionsByObject[o].append(intersect[o])
-        for o,sList in intersectionsByObject.items():
+        # static receivers had their arrivals scheduled when the wavefronts were emitted
+        self._collectArrivals(t, intersectionsByObject)
+        grids = {}
+        for band, members in bandMembers.items():
+            grid = self.receiverGrids.get(band)
+            if grid is None:
+                grid = ReceiverGrid.fromObstacles(self.environment.obstacleList, positions)
+            grid.refit(positions[members], displacement[members])
+            grids[band] = grid
+            rowMask = None if band is None else self.wavefronts.band == band
+            self._collectIntersections(self.wavefronts, grid, receivers[members], positions[members], pos2[members],
+                                       previous[members], prev2[members], sensitivity[members], intersectionsByObject,
+                                       True, t, speedBounds[members], rowMask, slots[members])
+        self.receiverGrids = grids
+        if instantFronts is not None:
+            self._deliverInstantly(instantFronts, receivers, frameRows, sensitivity, intersectionsByObject, instantLinks)
+
+        for o, hits in self.selectDeliveries(intersectionsByObject):
+            sList = []
+            for table, i, tArr, factor in hits:
+                properCopy = FieldSphere.fromTable(table, i, tArr, self.speed, factor)
+                properCopy.tArr = tArr
+                sList.append(properCopy)
             # TODO: combine wavefronts that interfere
             newWave = self.combineValues(sList)
             o.detectField(newWave)
-           
-
-    def _obstacleThreaded(self, args):
-        s = args[0]
-        obs = args[1]
-        bounceList = []
-        # check for the closest surfaces
-        # in future, more checks needed
-        # TODO: make this prettier
-        selected = {}
-        for f in obs.faces:
-            key = f[0]
-            at = f[1]
-            t = -s.center[key] + at
-            if key not in selected:
-                selected[key] = (f[0], f[1], t)
-            else:
-                otherT = selected[key][2]
-                if abs(otherT) > t:
-                    selected[key] = (f[0],f[1],t)
-
-        for v in selected.values():
-            bounceList.append(s.reflectOffSurface(*v))
-        bouncy = [i for i in bounceList if i is not None]
-        return bouncy       
-
-    def intersectObstacles(self, obsList):
-        allCombo = it.product(self._sphereGenerator(), obsList)
-        reflections = it.imap(self._obstacleThreaded, allCombo)
-        #reflections = self.sharedThreadPool.imap_unordered(self._obstacleThreaded, allCombo, 16)   
-        return it.chain.from_iterable(reflections)
-             
+
+    def selectDeliveries(self, intersectionsByObject):
+        '''Which receivers get their hits combined and delivered, as (object, hits) pairs. A hit is
+           (wavefront table, row, arrival time, intensity factor or None for the row's own).'''
+        return intersectionsByObject.items()
+
+    def shareGeometry(self, now):
+        '''Use the environment's geometry frame for this update, if it has one, so that fields with
+           receivers on the same devices look them up (and measure distances to them) only once'''
+        frame = getattr(self.environment, 'geometryFrame', None)
+        if frame is None or frame.t != now:
+            frame = GeometryFrame(now) # nobody to share with
+        self.geometry = frame
+
     def update(self, now):
-        # TODO: modify in-place
-        allObjects = self.objects.iterkeys()
-        for o in allObjects:
-            sphereList = self.objects[o]
-            newSpheres = self.spawnSphereFromObject(o) # TODO: check frequency!
-            for newSphere in newSpheres:
-                newSphere.obj_distances[o] = 0
-                sphereList.append(newSphere)
-            for s in sphereList:
-                s.prepareToDiscard(now)
-        self.performIntersections(now)
-        allObjects = self.objects.iterkeys()
-        for o in allObjects:
-            toRemove = []
-            sphereList = self.objects[o]
-            for s in sphereList:
-                if s.intensity is not None and s.intensity < self.minI:
-                    if s.destroyFlag:
-                        toRemove.append(s)
-                    else:
-                        s.destroyFlag = True
-            newList = [s for s in sphereList if s not in toRemove]
-            self.objects[o] = newList
-
-    def spawnSphereFromObject(self, o):
-        sphereList = []
+        self.shareGeometry(now)
+        instantFronts = None
+        instantLinks = None
+        if self.propagatesInstantly():
+            # light-speed fields: new emissions get delivered this update and never tracked
+            instantFronts = WavefrontTable(kernels=self.kernels)
+            instantLinks = self.spawnWavefronts(now, instantFronts)
+        else:
+            self.spawnWavefronts(now)
+            self.enforceBudget()
+        self.wavefronts.advance(now, self.speed, self.transmittedFraction)
+        self.performIntersections(now, instantFronts, instantLinks)
+        self.retireWavefronts(now)
+
+    def enforceBudget(self):
+        '''Degradation policy for when there are more than maxWavefronts fronts in flight: the
+           weakest ones are retired early. Intensity only falls as a front spreads, so these are
+           the ones nearest to expiring anyway, and what receivers lose is mostly faint echoes
+           and the far edges of old emissions. Fronts that have yet to leave their source count
+           as the strongest, so new emissions always get out.'''
+        table = self.wavefronts
+        excess = len(table) - self.maxWavefronts
+        if self.maxWavefronts <= 0 or excess <= 0:
+            return
+        strength = np.where(table.hasIntensity(), table.intensity, np.inf)
+        weakest = np.argsort(strength, kind='mergesort')[:excess]
+        table.discard(table.ids[weakest])
+        self.droppedWavefronts += excess
+
+    def retireWavefronts(self, now):
+        '''Drop the wavefronts that were already below minI at the last update. The decay is
+           known when a front is emitted, so nothing needs to be scanned for it.'''
+        self.wavefronts.discard(self._expiring)
+        if self.expiries is not None:
+            self._expiring = self.expiries.pop(now)
+
+    def detectionFloor(self):
+        '''Power per squared radius below which a front is of no use: it has decayed below minI,
+           or no receiver is sensitive enough to register it'''
+        return max(4*np.pi*self.minI, self.floorSensitivity)
+
+    def _fileExpiries(self, rows):
+        '''Work out when each new wavefront decays below the detection floor, and file it in the expiry wheel'''
+        table = self.wavefronts
+        if self.expiries is None:
+            self.expiries = TimeWheel(self.environment.dt, self.environment.time)
+        power = table.power[rows]*table.baseFactor[rows]
+        floor = self.detectionFloor()
+        with np.errstate(divide='ignore'):
+            fullR = np.sqrt(power/floor)
+            reducedR = np.sqrt(power*self.transmittedFraction/floor)
+        # the front drops below the floor at the reflection, if it is already weak enough by then
+        expiryR = np.maximum(reducedR, np.minimum(fullR, table.reflectAt[rows]))
+        for i, t in zip(table.ids[rows], table.t1[rows] + expiryR/self.speed):
+            self.expiries.add(t, i)
+
+    def _coalesce(self, emissions, now):
+        '''Merge (source, position, freq, power, t, data) emissions from the same source and band that
+           start within coalesceWindow of each other into one, at the time and place of the first,
+           with the strongest power and all their payloads. An emission is held back until its
+           window has closed, so coalescing delays wavefronts by up to the window.'''
+        if self.coalesceWindow <= 0:
+            return emissions
+        ready = []
+        for o, pos, freq, power, t, data in sorted(emissions, key=lambda e: e[4]):
+            key = (o, int(self.bandOf(freq)))
+            pending = self._pendingEmissions.get(key)
+            if pending is not None and t - pending[4] <= self.coalesceWindow:
+                pending[3] = max(pending[3], power)
+                pending[5].append(data)
+                continue
+            if pending is not None:
+                ready.append(pending)
+            self._pendingEmissions[key] = [o, pos, freq, power, t, [data]]
+        for key, pending in list(self._pendingEmissions.items()):
+            if now - pending[4] >= self.coalesceWindow:
+                ready.append(pending)
+                del self._pendingEmissions[key]
+        merged = []
+        for o, pos, freq, power, t, data in ready:
+            data = [d for d in data if d is not None]
+            if len(data) == 0:
+                data = None
+            elif len(data) == 1:
+                data = data[0]
+            else:
+                data = PayloadList(data)
+            merged.append((o, pos, freq, power, t, data))
+        return merged
+
+    def spawnWavefronts(self, now, table=None):
+        '''Add the new emissions (and their images) to table, which defaults to the tracked wavefronts.
+           For any other table, returns the emitters' links from the link table, if there is one.'''
+        return self.spawnEmissions(self.readyEmissions(now), table)
+
+    def readyEmissions(self, now):
+        '''(source, position, freq, power, t, data) of the emissions to spawn at now, once coalesced.
+           Emissions pushed with a position of their own are never coalesced, since one source
+           (e.g. a crowd) can emit from many places at once.'''
+        emissions = []
+        placed = []
+        for o, freq, power, t, data, position in self.dueEmissions(now):
+            if position is None:
+                emissions.append((o, o.getPosition(), freq, power, t, data))
+            else:
+                placed.append((o, position, freq, power, t, data))
+        return self._coalesce(emissions, now) + placed
+
+    def spawnEmissions(self, emissions, table=None, statics=None):
+        '''Spawn (source, position, freq, power, t, data) emissions into table, as for spawnWavefronts.
+           Arrivals of tracked wavefronts get scheduled at statics, or at every static receiver if None.'''
+        tracked = table is None
+        if tracked:
+            table = self.wavefronts
+        if len(emissions) == 0:
+            return None
+        sources, centers, freqs, powers, times, payloads = zip(*emissions)
+        links = None
+        trees = None
+        if not tracked and self.links is not None:
+            self._checkLayout()
+            floor = self.detectionFloor()
+            key = (self._layoutObstacleCount, self.reflectionOrder, floor)
+            links = [self.links.linksFrom(o, pos, power, self.surfaces, self.reflectionOrder, floor/(4*np.pi), key)
+                     for o, pos, power in zip(sources, centers, powers)]
+            # the emissions come from where their links were worked out, which is within the tolerance
+            centers = [entry.position for entry in links]
+            trees = [entry.tree for entry in links]
+        rows = table.append(centers, times, powers, freqs, sources, payloads, band=self.bandOf(freqs))
+        images = self.spawnReflections(table, rows, trees)
+        if not tracked:
+            return links
+        self._fileExpiries(rows)
+        self._fileExpiries(images)
+        if statics is None:
+            statics = [o for o in self.objects if o.isStatic]
+        self._scheduleArrivals(rows, statics)
+        self._scheduleArrivals(images, statics)
+
+    def dueEmissions(self, now):
+        '''(source, freq, power, t, data, position) of the emissions to spawn at now: polled from the
+           objects that don't push theirs, then popped from the queue. position is None for
+           emissions from wherever their source is.'''
+        emissions = []
+        for o in self._polledObjects:
+            for freq, power, t, data in self.emissionsFromObject(o): # TODO: check frequency!
+                emissions.append((o, freq, power, t, data, None))
+        emissions.extend(self.emissionQueue.pop(now))
+        return emissions
+
+    def spawnReflections(self, table, rows, trees=None):
+        '''Build the image-source tree of each new direct wavefront (unless they are given), and add the
+           images as wavefronts of their own. Since the walls don't move, this is all the reflecting
+           they will ever do.'''
+        self._checkLayout()
+        if self.reflectionOrder <= 0 or len(self.surfaces.axes) == 0:
+            return slice(len(table), len(table))
+        if trees is None:
+            minI = self.detectionFloor()/(4*np.pi) # no use keeping images nobody can hear
+            trees = [ImageSourceTree(table.centers[i], self.surfaces, self.reflectionOrder, table.power[i], minI)
+                     for i in range(rows.start, rows.stop)]
+        table.reflectAt[rows] = [tree.rootReflectAt for tree in trees]
+        counts = [len(tree) for tree in trees]
+        if sum(counts) == 0:
+            return slice(len(table), len(table))
+        owner = np.repeat(np.arange(rows.start, rows.stop), counts)
+        gather = lambda name: np.concatenate([getattr(tree, name) for tree in trees])
+        return table.append(gather('centers'), table.t1[owner], table.power[owner], table.frequency[owner],
+                            table.source[owner], table.data[owner], parent=table.ids[owner], band=table.band[owner],
+                            baseFactor=gather('factors'), phaseShift=gather('phaseShift'),
+                            activation=gather('activation'), reflectAt=gather('reflectAt'),
+                            regionLow=gather('regionLow'), regionHigh=gather('regionHigh'))
+
+    def pushEmission(self, o, freq, power, t, data=None, position=None):
+        '''Called by an object as it emits, instead of waiting to be polled with getRadiatedValues.
+           The wavefront is spawned at the first update at or after t, from position if it is
+           given, or else from where o is then.'''
+        if freq is None or power is None or freq <= 0 or power <= 0:
+            return
+        if position is not None:
+            position = tuple(float(x) for x in position)
+        self.emissionQueue.push(o, freq, power, t, data, position)
+
+    def pushEmissions(self, o, freq, powers, times, positions=None):
+        '''Push a batch of emissions from o at once, e.g. the footsteps of a crowd: arrays of their
+           powers and times, and optionally positions (one row each)'''
+        if freq is None or freq <= 0:
+            return
+        self.emissionQueue.pushBatch(o, freq, powers, times, positions)
+
+    def emissionsFromObject(self, o):
+        emissions = []
         allNew = o.getRadiatedValues()
         for info in allNew:
             if info is None or info[0] <= 0 or info[1] <= 0:
                 continue
             freq, power, t = info
-            newSphere = FieldSphere(o.getPosition(), self.speed, freq, power, t)
-            sphereList.append(newSphere)
-        return sphereList
+            emissions.append((freq, power, t, None))
+        return emissions
 
     def combineValues(self, sphereList):
         return sphereList[0]
 
 class VectorField(Field):
     # TODO: real vector shit
-    def __init__(self, propSpeed, minIntensity):
-        super(VectorField, self).__init__(propSpeed)
+    def __init__(self, propSpeed, minIntensity, **kwargs):
+        super(VectorField, self).__init__(propSpeed, **kwargs)
         self.minI = float(minIntensity)
 
+class TabulatedField(VectorField):
+    '''A VectorField whose static receivers hear emissions through a precomputed table of room
+       responses (see response_table) instead of tracked wavefronts: each emission is looked up at
+       its source, and its direct and first-order reflected arrivals at every static receiver are
+       queued up front. Wavefronts are still spawned if anything moving could hear them, and for
+       sources outside the table's grid. Echoes beyond the first reflection are not tabulated.
+
+       The table is built for the layout and static receivers at the first update (or by
+       precompute), and cached under cacheDir, so later runs of the same setup just load it.'''
+    def __init__(self, propSpeed, minIntensity, gridSpacing=0.25, cacheDir='response_cache', **kwargs):
+        super(TabulatedField, self).__init__(propSpeed, minIntensity, **kwargs)
+        self.gridSpacing = float(gridSpacing)
+        self.cacheDir = cacheDir
+        self.responses = None # ResponseTable for the receivers in self.tabulated
+        self.tabulated = [] # static receivers, in table column order
+        self._tableKey = None
+        # emissions that were looked up: a direct row and an echo row each, until their arrivals are delivered
+        self.rendered = WavefrontTable(kernels=self.kernels)
+        self.renderedArrivals = [] # heap of (arrival time, rendered id, tiebreak, receiver, intensity factor)
+        self._renderedPending = defaultdict(int) # rendered id -> arrivals not delivered yet
+        self._renderedDone = []
+
+    def memoryUsage(self):
+        usage = super(TabulatedField, self).memoryUsage()
+        usage['responseBytes'] = 0 if self.responses is None else self.responses.nbytes()
+        usage['renderedArrivals'] = len(self.renderedArrivals)
+        return usage
+
+    def precompute(self):
+        '''Build (or load) the response table for the current layout and static receivers'''
+        self.shareGeometry(self.environment.time)
+        return self.responseTable()
+
+    def responseTable(self):
+        '''The table for the current layout and static receivers, or None if there is nothing to tabulate'''
+        self._checkLayout()
+        statics = sorted([o for o in self.objects if o.isStatic], key=self.objects.get)
+        key = (self._layoutObstacleCount, tuple(statics))
+        if key == self._tableKey:
+            return self.responses
+        self._tableKey = key
+        self.tabulated = statics
+        self.responses = None
+        if len(statics) > 0 and len(self.environment.obstacleList) > 0:
+            positions = self.geometry.positions(self.geometry.locate(statics))
+            self.responses = cachedTable(self.environment.obstacleList, positions, self.gridSpacing, self.cacheDir)
+        return self.responses
+
+    def spawnWavefronts(self, now, table=None):
+        if table is not None:
+            return super(TabulatedField, self).spawnWavefronts(now, table) # delivered this update anyway
+        emissions = self.readyEmissions(now)
+        responses = self.responseTable()
+        looked = []
+        live = emissions
+        if responses is not None and len(emissions) > 0:
+            # every emission due is looked up at once
+            positions = np.array([e[1] for e in emissions], dtype=np.float64).reshape(-1, 3)
+            planes = firstPlanes(*self.surfaces.nearestPlanesOf(positions))
+            echoes, inside = responses.lookupOf(positions, planes)
+            looked = [e for e, k in zip(emissions, inside) if k]
+            live = [e for e, k in zip(emissions, inside) if not k]
+            if len(looked) > 0:
+                self._renderEmissions(looked, echoes[inside], np.abs(positions[inside][:, pathAxes] - planes[inside]))
+        self.spawnEmissions(live)
+        if any(not o.isStatic for o in self.objects):
+            self.spawnEmissions(looked, statics=[]) # the static receivers have theirs queued already
+
+    def _renderEmissions(self, emissions, echoes, activation):
+        '''Queue the arrivals of emissions at the tabulated receivers, given their echoes' path
+           lengths (emissions x receivers x PATHS) and activation radii (emissions x PATHS), under
+           the same rules as wavefronts: a reflection only counts once its front is physical, the
+           direct front loses power once it first reflects, and nothing is queued that would decay
+           below the detection floor or the receiver's sensitivity on the way'''
+        sources = [e[0] for e in emissions]
+        positions = np.array([e[1] for e in emissions], dtype=np.float64).reshape(-1, 3)
+        freqs = np.array([e[2] for e in emissions], dtype=np.float64)
+        power = np.array([e[3] for e in emissions], dtype=np.float64)
+        t = np.array([e[4] for e in emissions], dtype=np.float64)
+        floor = self.detectionFloor()
+        fraction = self.responses.reflectedFraction
+        with np.errstate(invalid='ignore'):
+            heard = power[:, None]*fraction >= floor*activation*activation # nan where there is no such path
+        reflectAt = np.where(heard, activation, np.inf).min(axis=1)
+        offsets = self.responses.receivers[None, :, :] - positions[:, None, :]
+        direct = np.sqrt(np.einsum('ijk,ijk->ij', offsets, offsets))
+        directFactor = np.where(direct < reflectAt[:, None], 1.0, self.transmittedFraction)
+        sensitivity = np.array([self.receiverSensitivity(r) for r in self.tabulated])
+        threshold = np.maximum(sensitivity, floor)
+        bands = self.bandOf(freqs)
+        inBand = self._inBand(bands, [self.receiverBand(r) for r in self.tabulated])
+        with np.errstate(invalid='ignore'):
+            directReaches = inBand & (power[:, None]*directFactor >= threshold[None, :]*direct*direct)
+            echoReaches = (inBand[:, :, None] & heard[:, None, :] & (echoes >= activation[:, None, :]) &
+                           (power[:, None, None]*fraction >= threshold[None, :, None]*echoes*echoes))
+        # a wavefront never hits the object that emitted it
+        column = dict((id(r), j) for j, r in enumerate(self.tabulated))
+        for n, o in enumerate(sources):
+            if id(o) in column:
+                directReaches[n, column[id(o)]] = False
+        rendered = np.flatnonzero(directReaches.any(axis=1) | echoReaches.any(axis=(1, 2)))
+        if len(rendered) == 0:
+            return
+        # a direct row and an echo row for each
+        both = np.repeat(rendered, 2)
+        rows = self.rendered.append(positions[both], t[both], power[both], freqs[both], [sources[n] for n in both],
+                                    [emissions[n][5] for n in both], band=bands[both],
+                                    phaseShift=np.tile([0, np.pi], len(rendered)),
+                                    baseFactor=np.tile([1.0, fraction], len(rendered)))
+        ids = np.full((len(emissions), 2), -1, dtype=np.int64)
+        ids[rendered] = self.rendered.ids[rows].reshape(-1, 2)
+        for n, j in zip(*np.nonzero(directReaches)):
+            heapq.heappush(self.renderedArrivals, (t[n] + direct[n, j]/self.speed, ids[n, 0], next(self._arrivalCount),
+                                                   self.tabulated[j], directFactor[n, j]))
+            self._renderedPending[ids[n, 0]] += 1
+        tArr = t[:, None, None] + echoes/self.speed
+        for n, j, path in zip(*np.nonzero(echoReaches)):
+            heapq.heappush(self.renderedArrivals, (tArr[n, j, path], ids[n, 1], next(self._arrivalCount),
+                                                   self.tabulated[j], fraction))
+            self._renderedPending[ids[n, 1]] += 1
+        # rows nothing arrives from can go with the next delivery
+        self._renderedDone.extend(i for i in ids[rendered].ravel() if i not in self._renderedPending)
+
+    def _collectArrivals(self, now, intersectionsByObject):
+        super(TabulatedField, self)._collectArrivals(now, intersectionsByObject)
+        # what was delivered last update is done with now
+        self.rendered.discard(self._renderedDone)
+        self._renderedDone = []
+        due = []
+        while len(self.renderedArrivals) > 0 and self.renderedArrivals[0][0] <= now:
+            due.append(heapq.heappop(self.renderedArrivals))
+        if len(due) == 0:
+            return
+        rows = self.rendered.rowsForIds([e[1] for e in due])
+        byObject = defaultdict(list)
+        for (tArr, renderedId, _, o, factor), i in zip(due, rows):
+            self._renderedPending[renderedId] -= 1
+            if self._renderedPending[renderedId] == 0:
+                del self._renderedPending[renderedId]
+                self._renderedDone.append(renderedId)
+            if o in self.objects: # it may have left before the arrival
+                byObject[o].append((i, tArr, factor))
+        for o, arrivals in byObject.items():
+            for i, tArr, factor in sorted(arrivals):
+                intersectionsByObject[o].append((self.rendered, i, tArr, factor))
+
 class SemanticField(Field):
-    def __init__(self, propSpeed, minIntensity):
-        super(SemanticField, self).__init__(propSpeed)
+    sumsInterference = True
+    def __init__(self, propSpeed, minIntensity, trackAllRssi='false', **kwargs):
+        super(SemanticField, self).__init__(propSpeed, **kwargs)
         self.minI = float(minIntensity)
+        # deliver to every receiver a packet reaches, not just the one it is addressed to
+        self.trackAllRssi = str(trackAllRssi).lower() == 'true'
+        self.addressIndex = defaultdict(set)
+
+    def addObject(self, o):
+        super(SemanticField, self).addObject(o)
+        address = o.getAddress()
+        if address is not None:
+            self.addressIndex[address].add(o)
+
+    def removeObject(self, o):
+        super(SemanticField, self).removeObject(o)
+        address = o.getAddress()
+        if address is not None:
+            self.addressIndex[address].discard(o)
+            if len(self.addressIndex[address]) == 0:
+                del self.addressIndex[address]
+
+    def selectDeliveries(self, intersectionsByObject):
+        '''A radio only takes the packets addressed to it, so the others needn't get the combine. The
+           addressed radio still combines everything that reached it, so interference is the same.'''
+        if self.trackAllRssi:
+            return intersectionsByObject.items()
+        addressed = set()
+        for hits in intersectionsByObject.values():
+            for table, i, _, _ in hits:
+                for packet in payloadList(table.data[i]):
+                    addressed.update(self.addressIndex.get(getattr(packet, 'address', None), ()))
+        return [(o, hits) for o, hits in intersectionsByObject.items()
+                if o in addressed or o.getAddress() is None]
 
     def combineValues(self, sphereList):
-        amplitudes, phases = zip(*[(np.sqrt(s.intensity), (2*np.pi*s.radius*s.frequency + s.phaseShift)) for s in sphereList])
-        polard = np.multiply(amplitudes, np.exp(1j*np.array(phases)))
+        polard = self.kernels.interfere([s.intensity for s in sphereList], [s.radius for s in sphereList],
+                                        [s.frequency for s in sphereList], [s.phaseShift for s in sphereList])
+        amplitudes = list(np.abs(polard))
 
         probs = np.abs(np.real(polard))
         probs = probs/np.sum(probs)
@@ -449,14 +1215,13 @@ class SemanticField(Field):
 
         return newSphere
 
-    def spawnSphereFromObject(self, o):
-        sphereList = []
+    def emissionsFromObject(self, o):
+        emissions = []
         allNew = o.getRadiatedValues()
         for info in allNew:
             if info is None or info[0] is None:
                 continue
             freq, val, t = info[0]
             data = info[1]
-            newSphere = FieldSphere(o.getPosition(), self.speed, freq, val, t, data)
-            sphereList.append(newSphere)
-        return sphereList
\ No newline at end of file
+            emissions.append((freq, val, t, data))
+        return emissions
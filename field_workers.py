@@ -0,0 +1,159 @@
+import itertools as it
+from multiprocessing import Process, Pipe
+from field_types import FieldObject
+from sharded_intersections import ShardedIntersector
+
+class ObstacleOutline(object):
+    """The parts of an obstacle a field uses, without its physics geometry, so it can be sent to a worker"""
+    def __init__(self, obs):
+        self.dim = tuple(obs.dim)
+        self.centerPos = tuple(obs.centerPos)
+        self.faces = list(obs.faces)
+
+class ReceiverProxy(FieldObject):
+    """Stands in for a field object inside a field worker. It holds what the field asks of the object,
+       as snapshotted on the main side each update, and records what the field delivers to it."""
+    pushesEmissions = True # the main side collects its emissions
+
+    def __init__(self, token, isStatic, outbox):
+        self.token = token
+        self.isStatic = isStatic
+        self.outbox = outbox
+
+    def setState(self, position, velocity, sensitivity, band, address):
+        self.position = position
+        self.velocity = velocity
+        self.sensitivity = sensitivity
+        self.band = band
+        self.address = address
+
+    def getPosition(self):
+        return self.position
+
+    def getVelocity(self):
+        return self.velocity
+
+    def getSensitivity(self):
+        return self.sensitivity
+
+    def getBand(self):
+        return self.band
+
+    def getAddress(self):
+        return self.address
+
+    def detectField(self, fieldValue):
+        self.outbox.append((self.token, fieldValue))
+
+class _WorkerEnvironment(object):
+    def __init__(self, dt):
+        self.dt = dt
+        self.time = 0
+        self.obstacleList = []
+        self.geometryFrame = None
+
+def _serveField(conn, field):
+    """ Worker loop: apply each update's snapshot to our copy of the field, update it, and send back its deliveries """
+    env = _WorkerEnvironment(field.environment.dt)
+    field.environment = env
+    field.intersector = ShardedIntersector(0, field.kernels) # a worker can't have workers of its own
+    for o in list(field.objects):
+        field.removeObject(o) # only the stand-ins belong in here
+    proxies = {}
+    outbox = []
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        now, obstacles, receivers, emissions = message
+        env.time = now
+        if obstacles is not None:
+            env.obstacleList = obstacles
+        current = set()
+        for token, isStatic, position, velocity, sensitivity, band, address in receivers:
+            current.add(token)
+            proxy = proxies.get(token)
+            if proxy is None:
+                proxy = ReceiverProxy(token, isStatic, outbox)
+                proxy.setState(position, velocity, sensitivity, band, address)
+                proxies[token] = proxy
+                field.addObject(proxy)
+            else:
+                proxy.setState(position, velocity, sensitivity, band, address)
+        for token in [k for k in proxies if k not in current]:
+            field.removeObject(proxies.pop(token))
+        for token, freq, power, t, data, position in emissions:
+            field.pushEmission(proxies.get(token), freq, power, t, data, position)
+        field.update(now)
+        conn.send(list(outbox))
+        del outbox[:]
+    conn.close()
+
+
+class FieldWorker(object):
+    """Updates a Field in a process of its own.
+
+       The process is forked when the field is added to the environment, so it starts out with an
+       empty copy of the field. Each update, send() snapshots the receivers (from the environment's
+       geometry frame) and their due emissions, and the worker updates its copy while the other
+       fields do the same. deliver() then calls detectField on the real objects, in the order the
+       worker's field delivered to its stand-ins. The field object on the main side only keeps
+       the receiver ids and the emission queue.
+    """
+    def __init__(self, field):
+        self.field = field
+        self.conn, child = Pipe()
+        self.process = Process(target=_serveField, args=(child, field))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+        self._tokens = {} # object -> token it has in the worker; tokens are never reused
+        self._objects = {}
+        self._tokenCount = it.count()
+        self._obstacleCount = None
+        self._waiting = False
+
+    def send(self, now, frame, obstacleList):
+        field = self.field
+        for o in [o for o in self._tokens if o not in field.objects]:
+            del self._objects[self._tokens.pop(o)]
+        objList = sorted(field.objects, key=field.objects.get)
+        rows = frame.locate(objList)
+        positions = frame.positions(rows)
+        receivers = []
+        for j, o in enumerate(objList):
+            token = self._tokens.get(o)
+            if token is None:
+                token = next(self._tokenCount)
+                self._tokens[o] = token
+                self._objects[token] = o
+            receivers.append((token, o.isStatic, tuple(positions[j]), frame.velocity(o), o.getSensitivity(), o.getBand(),
+                              o.getAddress()))
+        emissions = []
+        for o, freq, power, t, data, position in field.dueEmissions(now):
+            token = self._tokens.get(o)
+            if token is None and position is None:
+                position = tuple(o.getPosition()) # only emits, so the worker has no stand-in to ask
+            emissions.append((token, freq, power, t, data, position))
+        obstacles = None
+        if self._obstacleCount != len(obstacleList):
+            obstacles = [ObstacleOutline(obs) for obs in obstacleList]
+            self._obstacleCount = len(obstacleList)
+        self.conn.send((now, obstacles, receivers, emissions))
+        self._waiting = True
+
+    def deliver(self):
+        if not self._waiting:
+            return
+        self._waiting = False
+        for token, fieldValue in self.conn.recv():
+            o = self._objects.get(token)
+            if o is not None:
+                o.detectField(fieldValue)
+
+    def close(self):
+        # anything the worker still owes (from the last update, when pipelined) is delivered first
+        self.deliver()
+        if self.process.is_alive():
+            self.conn.send(None)
+            self.process.join()
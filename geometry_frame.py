@@ -0,0 +1,66 @@
+import numpy as np
+
+class GeometryFrame(object):
+    """Where the field receivers are at one update, shared by all the fields of an environment.
+
+       Receivers are keyed by the device they are mounted on, so co-located field objects (a
+       device's Radio and SemanticRadio, say) get looked up once per update, however many fields
+       they are in. Squared distances from emission points to the receivers are kept as well,
+       so a field spawning from points another field already measured reuses them. Each field
+       applies its own speed, intensity and semantics on top.
+    """
+    def __init__(self, t=None):
+        self.t = t
+        self.rows = {} # device -> row
+        self._points = []
+        self._positions = np.empty((0, 3))
+        self._norms = np.empty(0)
+        self._velocities = {} # device -> velocity, or None if unknown
+        self._distances = {} # emission point -> its squared distances to every row at the time
+
+    def __len__(self):
+        return len(self._points)
+
+    def locate(self, objList):
+        """ Row of each object's device, looking up the devices we haven't seen yet """
+        rows = np.empty(len(objList), dtype=int)
+        for j, o in enumerate(objList):
+            key = getattr(o, 'device', o)
+            row = self.rows.get(key)
+            if row is None:
+                row = len(self._points)
+                self.rows[key] = row
+                self._points.append(o.getPosition())
+            rows[j] = row
+        if len(self._points) > len(self._positions):
+            self._positions = np.array(self._points, dtype=np.float64).reshape(-1, 3)
+            self._norms = np.einsum('ij,ij->i', self._positions, self._positions)
+        return rows
+
+    def positions(self, rows):
+        return self._positions[rows]
+
+    def squaredNorms(self, rows):
+        return self._norms[rows]
+
+    def velocity(self, o):
+        key = getattr(o, 'device', o)
+        if key not in self._velocities:
+            self._velocities[key] = o.getVelocity()
+        return self._velocities[key]
+
+    def squaredDistances(self, points, rows):
+        """ Squared distance from each of points to each receiver row. Points are measured one by
+            one, so any point measured before this update is reused, whatever batch it came in. """
+        points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 3)
+        n = len(self._positions)
+        keys = [p.tobytes() for p in points]
+        known = [self._distances.get(key) for key in keys]
+        missing = [i for i, d2 in enumerate(known) if d2 is None or len(d2) < n]
+        if len(missing) > 0:
+            offsets = points[missing][:, None, :] - self._positions[None, :, :]
+            for i, d2 in zip(missing, np.einsum('ijk,ijk->ij', offsets, offsets)):
+                self._distances[keys[i]] = known[i] = d2
+        if len(known) == 0:
+            return np.empty((0, len(rows)))
+        return np.array(known)[:, rows]
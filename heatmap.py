@@ -1,4 +1,10 @@
+import os
 import numpy as np
+from image_sources import ReflectingSurfaces, ImageSourceTree, inRegion
+from spatial_index import obstacleBounds, layoutDigest
+
+coverageVersion = 1 # bump when the maps change, so old cache files get ignored
+
 class Heatmap(object):
     """description of class"""
     heatMapValues = np.array( [[255,    0,    0],
@@ -30,7 +36,105 @@ class Heatmap(object):
             idx = -1
         return cls.heatMapValues[idx]
 
+    @classmethod
+    def colorize(cls, values, minVal, maxVal):
+        """ getHeatmapValue for a whole array of values at once: an array of their colors, with an extra last axis for rgb """
+        values = np.clip(np.asarray(values, dtype=np.float64), minVal, maxVal)
+        if maxVal == minVal:
+            idx = np.zeros(values.shape, dtype=int)
+        else:
+            idx = ((values - minVal)/float(maxVal - minVal)*len(cls.heatMapValues)).astype(int)
+            idx[idx == len(cls.heatMapValues)] = -1
+        return cls.heatMapValues[idx]
+
+
+class CoverageMap(object):
+    """Intensity a receiver would register from one emitter, over a grid of points spanning the
+       layout. Point (i, j, k) is at origin + spacing*(i, j, k). nan inside obstacles."""
+    def __init__(self, origin, spacing, intensity):
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.spacing = float(spacing)
+        self.intensity = intensity
+
+    @property
+    def shape(self):
+        return self.intensity.shape
+
+    def points(self):
+        axes = [self.origin[k] + self.spacing*np.arange(self.shape[k]) for k in range(3)]
+        return np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1)
+
+    def rssi(self):
+        """ As the radios work it out, in dBm """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return 10*np.log10(1000*np.asarray(self.intensity))
+
+    def colors(self, minVal=None, maxVal=None):
+        """ Heatmap color of the rssi at every point, nan points in black """
+        rssi = self.rssi()
+        finite = np.isfinite(rssi)
+        if minVal is None:
+            minVal = rssi[finite].min() if finite.any() else 0.0
+        if maxVal is None:
+            maxVal = rssi[finite].max() if finite.any() else 0.0
+        colors = Heatmap.colorize(np.where(finite, rssi, minVal), minVal, maxVal)
+        colors[~finite] = 0
+        return colors
 
 
+def _coverageChunk(points, position, tree, power, frequency, transmittedFraction):
+    """ Intensity at each of points from the direct front out of position and every image in
+        tree, combined the way SemanticField combines what reaches a radio """
+    offsets = points[:, None, :] - np.vstack([position[None, :], tree.centers])[None, :, :]
+    r = np.sqrt(np.einsum('ijk,ijk->ij', offsets, offsets))
+    factor = np.concatenate([[1.0], tree.factors])
+    reflectAt = np.concatenate([[tree.rootReflectAt], tree.reflectAt])
+    factor = np.where(r >= reflectAt[None, :], factor*transmittedFraction, factor)
+    activation = np.concatenate([[0.0], tree.activation])
+    # an image only reaches the points on the source's side of the planes it was mirrored in
+    reached = (r >= activation[None, :]) & inRegion(points, np.vstack([np.full((1, 3), -np.inf), tree.regionLow]),
+                                                    np.vstack([np.full((1, 3), np.inf), tree.regionHigh]))
+    phaseShift = np.concatenate([[0.0], tree.phaseShift])
+    with np.errstate(divide='ignore'):
+        intensity = np.where(reached, power*factor/(r*r), 0.0)
+    amplitude = np.sqrt(intensity)*np.exp(1j*(2*np.pi*r*frequency + phaseShift[None, :]))
+    total = np.abs(np.real(amplitude.sum(axis=1)))
+    return total*total
 
 
+def coverageMap(obstacleList, position, power, frequency, spacing=0.25, reflectionOrder=1, minI=1e-12,
+                transmittedFraction=0.75, cacheDir=None, chunk=65536):
+    """ CoverageMap of an emitter at position over the layout, with its reflections off the
+        obstacles up to reflectionOrder, worked out with the same image sources as the fields.
+        If cacheDir is given, maps are kept there as .npy files keyed by the layout and the
+        emitter, and loaded memory-mapped, so asking for the same map again costs nothing. """
+    position = np.asarray(position, dtype=np.float64)
+    lower, upper = obstacleBounds(obstacleList, [position])
+    shape = tuple(np.ceil((upper - lower)/spacing).astype(int) + 1)
+    path = None
+    if cacheDir:
+        key = layoutDigest(obstacleList, coverageVersion, [round(float(x), 6) for x in position], float(power), float(frequency),
+                           float(spacing), int(reflectionOrder), float(minI), float(transmittedFraction)).hexdigest()
+        path = os.path.join(cacheDir, 'coverage-%s.npy' % key)
+        if os.path.exists(path):
+            return CoverageMap(lower, spacing, np.load(path, mmap_mode='r'))
+    coverage = CoverageMap(lower, spacing, np.empty(shape))
+    tree = ImageSourceTree(position, ReflectingSurfaces(obstacleList), int(reflectionOrder), power, minI)
+    points = coverage.points().reshape(-1, 3)
+    flat = coverage.intensity.reshape(-1)
+    for start in range(0, len(points), chunk):
+        flat[start:start+chunk] = _coverageChunk(points[start:start+chunk], position, tree, power, frequency, transmittedFraction)
+    for obs in obstacleList:
+        half = np.divide(obs.dim, 2.0)
+        inside = np.all((points >= np.subtract(obs.centerPos, half)) & (points <= np.add(obs.centerPos, half)), axis=1)
+        flat[inside] = np.nan
+    if path is not None:
+        try:
+            if not os.path.isdir(cacheDir):
+                os.makedirs(cacheDir)
+            np.save(path + '.tmp', coverage.intensity)
+            os.rename(path + '.tmp.npy', path) # so nobody maps a half-written file
+            coverage.intensity = np.load(path, mmap_mode='r')
+        except (IOError, OSError):
+            pass # still good for this run
+    return coverage
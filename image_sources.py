@@ -0,0 +1,143 @@
+import numpy as np
+import itertools as it
+
+class ReflectingSurfaces(object):
+    """The faces of the (axis-aligned) obstacles in a layout, as planes that waves reflect off"""
+    def __init__(self, obstacleList):
+        axes = []
+        offsets = []
+        owners = []
+        for n, obs in enumerate(obstacleList):
+            for axis, at in obs.faces:
+                axes.append(axis)
+                offsets.append(at)
+                owners.append(n)
+        self.axes = np.array(axes, dtype=int)
+        self.offsets = np.array(offsets, dtype=np.float64)
+        self.owners = np.array(owners, dtype=int)
+        self.obstacleCount = len(obstacleList)
+
+    def nearestPlanes(self, point):
+        """ Per axis, the nearest plane below and above point (-inf/inf if there is none).
+            Like the old per-step reflections, only the closest face of each obstacle counts. """
+        lower = np.full(3, -np.inf)
+        upper = np.full(3, np.inf)
+        if len(self.axes) == 0:
+            return lower, upper
+        t = self.offsets - np.asarray(point, dtype=np.float64)[self.axes]
+        key = self.owners*3 + self.axes
+        order = np.lexsort((np.abs(t), key))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = key[order][1:] != key[order][:-1]
+        chosen = order[first]
+        below = chosen[t[chosen] < 0]
+        above = chosen[t[chosen] > 0] # no edge reflections for now
+        np.maximum.at(lower, self.axes[below], self.offsets[below])
+        np.minimum.at(upper, self.axes[above], self.offsets[above])
+        return lower, upper
+
+    def nearestPlanesOf(self, points):
+        """ nearestPlanes for each of points at once, as (points x 3) arrays of lower and upper planes """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        lower = np.full(points.shape, -np.inf)
+        upper = np.full(points.shape, np.inf)
+        key = self.owners*3 + self.axes
+        every = np.arange(len(points))
+        for k in np.unique(key):
+            faces = np.flatnonzero(key == k)
+            axis = self.axes[faces[0]]
+            t = self.offsets[faces][None, :] - points[:, axis][:, None]
+            closest = np.abs(t).argmin(axis=1)
+            t = t[every, closest]
+            at = self.offsets[faces][closest]
+            below = t < 0
+            above = t > 0
+            lower[below, axis] = np.maximum(lower[below, axis], at[below])
+            upper[above, axis] = np.minimum(upper[above, axis], at[above])
+        return lower, upper
+
+
+def _axisChains(x, lower, upper, maxOrder):
+    """ Images of coordinate x bouncing back and forth between the planes lower and upper.
+        Yields (bounces, first side, image coordinate, distance from the image to its last plane) """
+    yield 0, -1, x, 0.0
+    planes = (lower, upper)
+    for side in (0, 1):
+        coord = x
+        for n in range(1, maxOrder+1):
+            plane = planes[(side + n - 1) % 2]
+            if not np.isfinite(plane):
+                break
+            gap = abs(coord - plane)
+            coord = 2*plane - coord
+            yield n, side, coord, gap
+
+
+class ImageSourceTree(object):
+    """Image sources of one emission, up to maxOrder reflections, pruned by cumulative attenuation.
+
+       An image reflected n times carries reflectedFraction**n of the power and a phase shift of
+       n*pi. Its activation radius is a lower bound on how far its front travels before it is
+       physical (it must at least get back to the planes it was mirrored in). Images whose intensity
+       at that radius is already below minI are dropped, along with everything beyond them.
+       reflectAt is the smallest activation radius among each node's children, which is when the
+       node's own front gets attenuated by the reflection. An image's path only exists on the
+       source's side of every plane it was mirrored in: regionLow and regionHigh bound that box.
+    """
+    reflectedFraction = 0.5
+
+    def __init__(self, point, surfaces, maxOrder, power, minI):
+        lower, upper = surfaces.nearestPlanes(point)
+        chains = [list(_axisChains(point[k], lower[k], upper[k], maxOrder)) for k in range(3)]
+
+        nodes = {}
+        for combo in it.product(*chains):
+            order = sum(c[0] for c in combo)
+            if order == 0 or order > maxOrder:
+                continue
+            factor = self.reflectedFraction**order
+            activation = np.sqrt(sum(c[3]*c[3] for c in combo))
+            if power*factor/(4*np.pi*activation*activation) < minI:
+                continue
+            key = tuple((c[0], c[1]) for c in combo)
+            # a chain of one bounce used only the plane on its first side, longer ones both
+            low = tuple(lower[k] if c[0] > 1 or (c[0] == 1 and c[1] == 0) else -np.inf for k, c in enumerate(combo))
+            high = tuple(upper[k] if c[0] > 1 or (c[0] == 1 and c[1] == 1) else np.inf for k, c in enumerate(combo))
+            nodes[key] = (tuple(c[2] for c in combo), order, factor, activation, low, high)
+
+        self.keys = sorted(nodes, key=lambda k: (nodes[k][1], k))
+        self.centers = np.array([nodes[k][0] for k in self.keys], dtype=np.float64).reshape(-1, 3)
+        self.orders = np.array([nodes[k][1] for k in self.keys], dtype=int)
+        self.factors = np.array([nodes[k][2] for k in self.keys], dtype=np.float64)
+        self.activation = np.array([nodes[k][3] for k in self.keys], dtype=np.float64)
+        self.regionLow = np.array([nodes[k][4] for k in self.keys], dtype=np.float64).reshape(-1, 3)
+        self.regionHigh = np.array([nodes[k][5] for k in self.keys], dtype=np.float64).reshape(-1, 3)
+        self.phaseShift = np.pi*(self.orders % 2)
+
+        # a child adds one bounce on one axis
+        rootKey = ((0, -1),)*3
+        self.reflectAt = np.full(len(self.keys), np.inf)
+        self.rootReflectAt = np.inf
+        index = dict((k, n) for n, k in enumerate(self.keys))
+        for n, key in enumerate(self.keys):
+            for axis in range(3):
+                bounces, side = key[axis]
+                if bounces == 0:
+                    continue
+                parentKey = list(key)
+                parentKey[axis] = (bounces-1, side if bounces > 1 else -1)
+                parentKey = tuple(parentKey)
+                if parentKey == rootKey:
+                    self.rootReflectAt = min(self.rootReflectAt, self.activation[n])
+                elif parentKey in index:
+                    p = index[parentKey]
+                    self.reflectAt[p] = min(self.reflectAt[p], self.activation[n])
+
+    def __len__(self):
+        return len(self.keys)
+
+def inRegion(points, regionLow, regionHigh):
+    """ Whether each point is inside each region (points x regions), i.e. on the source's side of
+        every plane the region's image was mirrored in """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)[:, None, :]
+    return ((points >= regionLow[None, :, :]) & (points <= regionHigh[None, :, :])).all(axis=2)
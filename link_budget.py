@@ -0,0 +1,86 @@
+import numpy as np
+from image_sources import ImageSourceTree
+
+class SourceLinks(object):
+    """The paths out of one emitter position, direct first and then its image sources, with the
+       squared length of each to every receiver id. A receiver's column is only recomputed once
+       it has moved more than the tolerance from where it was computed."""
+    def __init__(self, position, power, tree):
+        self.position = np.array(position, dtype=np.float64)
+        self.power = power
+        self.tree = tree
+        self.centers = np.vstack([self.position[None, :], tree.centers])
+        self.receiverPositions = np.empty((0, 3))
+        self.d2 = np.empty((len(self.centers), 0))
+
+    def _grow(self, n):
+        extra = n - self.d2.shape[1]
+        self.receiverPositions = np.vstack([self.receiverPositions, np.full((extra, 3), np.nan)])
+        self.d2 = np.hstack([self.d2, np.full((len(self.centers), extra), np.nan)])
+
+    def squaredDistances(self, ids, positions, tolerance):
+        """ Squared length of every path to the receivers with the given ids, now at positions.
+            Returns the paths x receivers array and how many receiver columns had to be recomputed. """
+        if len(ids) == 0:
+            return np.empty((len(self.centers), 0)), 0
+        if ids.max() >= self.d2.shape[1]:
+            self._grow(max(ids.max()+1, 2*self.d2.shape[1]))
+        offsets = positions - self.receiverPositions[ids]
+        moved = ~(np.einsum('ij,ij->i', offsets, offsets) <= tolerance*tolerance) # never computed is nan, so moved
+        if moved.any():
+            stale = ids[moved]
+            toPaths = self.centers[:, None, :] - positions[moved][None, :, :]
+            self.d2[:, stale] = np.einsum('ijk,ijk->ij', toPaths, toPaths)
+            self.receiverPositions[stale] = positions[moved]
+        return self.d2[:, ids], int(moved.sum())
+
+
+class LinkTable(object):
+    """Link budgets between the emitters and receivers of a field that delivers instantly.
+
+       For each emitter it keeps the image-source tree of its last position and the length of
+       every path from there to each receiver, so an update only recomputes the links whose
+       endpoints moved more than tolerance since they were cached. An emitter that moved that far,
+       or changed power, gets a new entry; emissions from one that didn't are treated as coming
+       from where its entry was made. Everything is dropped when the layout, the reflection
+       order or the detection floor change.
+    """
+    def __init__(self, tolerance):
+        self.tolerance = float(tolerance)
+        self.sources = {} # emitter -> SourceLinks
+        self.key = None
+        self.rebuilt = 0 # emitter entries made, for profiling
+        self.recomputed = 0 # receiver columns recomputed
+
+    def __len__(self):
+        return len(self.sources)
+
+    def forget(self, o):
+        self.sources.pop(o, None)
+
+    def linksFrom(self, source, position, power, surfaces, reflectionOrder, minI, key):
+        if key != self.key:
+            self.sources = {}
+            self.key = key
+        position = np.asarray(position, dtype=np.float64)
+        links = self.sources.get(source)
+        if links is not None and links.power == power:
+            offset = links.position - position
+            if np.dot(offset, offset) <= self.tolerance*self.tolerance:
+                return links
+        links = SourceLinks(position, power, ImageSourceTree(position, surfaces, reflectionOrder, power, minI))
+        self.sources[source] = links
+        self.rebuilt += 1
+        return links
+
+    def squaredDistances(self, linkList, ids, positions):
+        """ Squared distances from the rows of an instant table, made from the emissions with the
+            given links (direct rows first, then each emission's images in turn), to the receivers """
+        blocks = []
+        for links in linkList:
+            d2, recomputed = links.squaredDistances(ids, positions, self.tolerance)
+            self.recomputed += recomputed
+            blocks.append(d2)
+        direct = [d2[:1] for d2 in blocks]
+        images = [d2[1:] for d2 in blocks]
+        return np.vstack(direct + images)
@@ -0,0 +1,207 @@
+"""Batched ray tracing against axis-aligned boxes, for RayField.
+
+   Every ray is tested against every box at once with the slab test, and reflections off the
+   obstacles are worked out for all rays together, one bounce at a time.
+"""
+import numpy as np
+
+class AxisAlignedBoxes(object):
+    """Lower and upper corners of a set of boxes, one row each"""
+    def __init__(self, lower, upper):
+        self.lower = np.asarray(lower, dtype=np.float64).reshape(-1, 3)
+        self.upper = np.asarray(upper, dtype=np.float64).reshape(-1, 3)
+
+    def __len__(self):
+        return len(self.lower)
+
+    @classmethod
+    def fromObstacles(cls, obstacleList):
+        half = np.array([np.divide(obs.dim, 2.0) for obs in obstacleList], dtype=np.float64).reshape(-1, 3)
+        centers = np.array([obs.centerPos for obs in obstacleList], dtype=np.float64).reshape(-1, 3)
+        return cls(centers - half, centers + half)
+
+
+class RayHits(object):
+    """What the rays hit: one entry per (ray, receiver box) hit, with the index of the ray it
+       came from, the distance along its path, the power left after its reflections, and how
+       many times it had bounced"""
+    def __init__(self, ray, receiver, distance, power, bounces):
+        self.ray = ray
+        self.receiver = receiver
+        self.distance = distance
+        self.power = power
+        self.bounces = bounces
+
+    def __len__(self):
+        return len(self.ray)
+
+
+def slabTest(origins, directions, lengths, boxes):
+    """ Distance along each ray to where it enters each box, inf where it misses or the box is
+        beyond its length (0 if it starts inside), and the axis of the face it enters through """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverse = 1.0/directions
+        near = (boxes.lower[None, :, :] - origins[:, None, :])*inverse[:, None, :]
+        far = (boxes.upper[None, :, :] - origins[:, None, :])*inverse[:, None, :]
+    # a ray parallel to a slab is either always in it or never
+    parallel = (directions == 0)[:, None, :]
+    inside = (origins[:, None, :] >= boxes.lower[None, :, :]) & (origins[:, None, :] <= boxes.upper[None, :, :])
+    near = np.where(parallel, np.where(inside, -np.inf, np.inf), near)
+    far = np.where(parallel, np.where(inside, np.inf, -np.inf), far)
+    entry = np.minimum(near, far)
+    exit = np.maximum(near, far)
+    tEnter = entry.max(axis=2)
+    tExit = exit.min(axis=2)
+    axis = entry.argmax(axis=2)
+    tEnter = np.maximum(tEnter, 0)
+    hit = (tExit >= tEnter) & (tEnter <= lengths[:, None])
+    return np.where(hit, tEnter, np.inf), axis
+
+
+class RaySegments(object):
+    """The straight pieces of traced rays: the ray each belongs to, where it starts, its direction
+       and length, how far along the ray it starts, the fraction of the ray's power it still
+       carries, and how many times the ray had bounced"""
+    def __init__(self, ray, origin, direction, length, start, fraction, bounces):
+        self.ray = ray
+        self.origin = origin
+        self.direction = direction
+        self.length = length
+        self.start = start
+        self.fraction = fraction
+        self.bounces = bounces
+
+    def __len__(self):
+        return len(self.ray)
+
+
+def tracePaths(origins, directions, lengths, obstacles, bounces=1, reflectedFraction=0.5, epsilon=1e-9):
+    """ Trace rays (origin, unit direction, length) through the obstacle boxes, reflecting off
+        them up to bounces times, into the segments they travel along """
+    origins = np.array(origins, dtype=np.float64).reshape(-1, 3)
+    directions = np.array(directions, dtype=np.float64).reshape(-1, 3)
+    lengths = np.array(lengths, dtype=np.float64)
+    rays = np.arange(len(origins))
+    travelled = np.zeros(len(origins))
+    fractions = np.ones(len(origins))
+    found = []
+    for bounce in range(bounces+1):
+        if len(rays) == 0:
+            break
+        stop = lengths.copy()
+        blocker = np.full(len(rays), -1, dtype=int)
+        axis = np.zeros(len(rays), dtype=int)
+        if len(obstacles) > 0:
+            tObstacle, obstacleAxis = slabTest(origins, directions, lengths, obstacles)
+            blocker = tObstacle.argmin(axis=1)
+            nearest = tObstacle[np.arange(len(rays)), blocker]
+            axis = obstacleAxis[np.arange(len(rays)), blocker]
+            blocked = np.isfinite(nearest)
+            blocker[~blocked] = -1
+            stop[blocked] = nearest[blocked]
+        found.append((rays, origins, directions, stop, travelled, fractions, np.full(len(rays), bounce)))
+        # reflect whatever reached an obstacle, mirroring its direction in the face it hit
+        keep = blocker >= 0
+        if bounce == bounces or not keep.any():
+            break
+        rays, origins, directions, lengths = rays[keep], origins[keep], directions[keep], lengths[keep]
+        stop, axis, travelled, fractions = stop[keep], axis[keep], travelled[keep], fractions[keep]
+        origins = origins + directions*stop[:, None]
+        directions = directions.copy()
+        flip = np.arange(len(rays))
+        directions[flip, axis] = -directions[flip, axis]
+        origins[flip, axis] += np.sign(directions[flip, axis])*epsilon # step off the face
+        lengths = lengths - stop
+        travelled = travelled + stop
+        fractions = fractions*reflectedFraction
+    if len(found) == 0:
+        return RaySegments(np.empty(0, dtype=int), np.empty((0, 3)), np.empty((0, 3)), np.empty(0), np.empty(0),
+                           np.empty(0), np.empty(0, dtype=int))
+    parts = [np.concatenate(part) for part in zip(*found)]
+    return RaySegments(*parts)
+
+
+def segmentHits(segments, receivers, sources=None):
+    """ The receiver boxes each segment passes through. Receivers don't block rays. A ray never
+        hits sources[ray], the receiver it was emitted from, before it has bounced. The hits'
+        power is the fraction of their ray's power that reaches the receiver. """
+    if len(segments) == 0 or len(receivers) == 0:
+        empty = np.empty(0, dtype=int)
+        return RayHits(empty, empty, np.empty(0), np.empty(0), empty)
+    tReceiver, _ = slabTest(segments.origin, segments.direction, segments.length, receivers)
+    if sources is not None:
+        own = np.flatnonzero((segments.bounces == 0) & (sources[segments.ray] >= 0))
+        tReceiver[own, sources[segments.ray[own]]] = np.inf
+    i, j = np.nonzero(np.isfinite(tReceiver))
+    return RayHits(segments.ray[i], j, segments.start[i] + tReceiver[i, j], segments.fraction[i], segments.bounces[i])
+
+
+def trace(origins, directions, lengths, powers, obstacles, receivers, sources=None, bounces=1,
+          reflectedFraction=0.5, epsilon=1e-9):
+    """ Trace rays (origin, unit direction, length, power) through the obstacle boxes, reflecting
+        off them up to bounces times, and collect the receiver boxes they pass through before
+        reaching an obstacle or running out of length. See segmentHits. """
+    segments = tracePaths(origins, directions, lengths, obstacles, bounces, reflectedFraction, epsilon)
+    if sources is not None:
+        sources = np.asarray(sources, dtype=int)
+    hits = segmentHits(segments, receivers, sources)
+    hits.power = hits.power*np.asarray(powers, dtype=np.float64)[hits.ray]
+    return hits
+
+
+class RayPathCache(object):
+    """Traced ray paths from each emitter, reused while the emitter stays where it is and the
+       layout doesn't change, so static emitters don't get re-traced every update.
+
+       The paths are traced far enough for the strongest emission seen from there. Receivers
+       don't block rays, so what a receiver picks up from an emitter's paths is kept separately,
+       and only redone when that receiver's box (or the emitter's paths) change.
+    """
+    def __init__(self, directions, bounces, reflectedFraction=0.5):
+        self.directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        self.bounces = bounces
+        self.reflectedFraction = reflectedFraction
+        self.layoutKey = None
+        self.paths = {} # emitter -> (position, length, segments)
+        self.hits = {} # (emitter, receiver) -> (lower, upper, RayHits)
+        self.traces = 0 # how many times paths had to be traced, for profiling
+
+    def forget(self, o):
+        self.paths.pop(o, None)
+        for key in [k for k in self.hits if o in k]:
+            del self.hits[key]
+
+    def pathsFrom(self, emitter, position, length, obstacles, layoutKey):
+        """ The segments of the rays from position, traced at least length far """
+        if layoutKey != self.layoutKey:
+            self.paths = {}
+            self.hits = {}
+            self.layoutKey = layoutKey
+        position = tuple(position)
+        entry = self.paths.get(emitter)
+        if entry is None or entry[0] != position or entry[1] < length:
+            n = len(self.directions)
+            segments = tracePaths(np.tile(position, (n, 1)), self.directions, np.full(n, length), obstacles,
+                                  self.bounces, self.reflectedFraction)
+            entry = (position, length, segments)
+            self.paths[emitter] = entry
+            self.traces += 1
+            for key in [k for k in self.hits if k[0] is emitter]:
+                del self.hits[key]
+        return entry[2]
+
+    def hitsOn(self, emitter, receiver, lower, upper):
+        """ Where the emitter's cached rays pass through the receiver's box, sorted by distance """
+        entry = self.hits.get((emitter, receiver))
+        if entry is None or not (np.array_equal(entry[0], lower) and np.array_equal(entry[1], upper)):
+            segments = self.paths[emitter][2]
+            sources = None
+            if emitter is receiver:
+                sources = np.zeros(len(self.directions), dtype=int)
+            hits = segmentHits(segments, AxisAlignedBoxes(lower, upper), sources)
+            order = np.argsort(hits.distance, kind='mergesort')
+            hits = RayHits(hits.ray[order], hits.receiver[order], hits.distance[order], hits.power[order],
+                           hits.bounces[order])
+            entry = (np.array(lower), np.array(upper), hits)
+            self.hits[(emitter, receiver)] = entry
+        return entry[2]
@@ -0,0 +1,158 @@
+"""Precomputed first-order room responses, for fields whose receivers don't move.
+
+   For each point of a grid over the layout, a ResponseTable holds the length of every first-order
+   reflected path to each static receiver (off the nearest plane below and above on each axis, as
+   ImageSourceTree finds them). A source anywhere in the grid gets its echoes' arrival times and
+   gains at every receiver by interpolating between the grid points around it, instead of
+   propagating wavefronts. The direct path is cheaper to measure than to look up, so it isn't
+   tabulated.
+
+   Tables are cached on disk, keyed by a hash of the layout, the receivers and the grid.
+"""
+import os
+import numpy as np
+from image_sources import ReflectingSurfaces, ImageSourceTree
+from spatial_index import obstacleBounds, layoutDigest
+
+PATHS = 6 # first reflections: off the plane below and the plane above, on each axis in turn
+pathAxes = np.repeat(np.arange(3), 2)
+tableVersion = 2 # bump when the table layout changes, so old cache files get ignored
+
+corners = np.array(list(np.ndindex(2, 2, 2)))
+
+def firstPlanes(lower, upper):
+    """ The plane each first reflection is mirrored in, as (points x PATHS), nan where there is
+        none, from the nearest planes below and above (see ReflectingSurfaces) """
+    lower = np.atleast_2d(lower)
+    upper = np.atleast_2d(upper)
+    planes = np.empty((len(lower), PATHS))
+    planes[:, 0::2] = lower
+    planes[:, 1::2] = upper
+    planes[~np.isfinite(planes)] = np.nan
+    return planes
+
+def imageLengths(points, planes, receivers):
+    """ Length of each first-order path from points (mirrored in planes) to every receiver, as
+        (points x receivers x PATHS), nan for receivers behind the plane, where the path doesn't exist """
+    images = np.repeat(points[:, None, :], PATHS, axis=1)
+    images[:, np.arange(PATHS), pathAxes] = 2*planes - points[:, pathAxes]
+    offsets = images[:, None, :, :] - receivers[None, :, None, :]
+    lengths = np.sqrt(np.einsum('ijkl,ijkl->ijk', offsets, offsets))
+    # paths off the plane below need the receiver above it, and the other way round
+    ahead = (receivers[None, :, pathAxes] - planes[:, None, :])*np.where(np.arange(PATHS) % 2, -1.0, 1.0)
+    with np.errstate(invalid='ignore'):
+        lengths[~(ahead >= 0)] = np.nan
+    return lengths
+
+
+class ResponseTable(object):
+    """Reflected path lengths from a grid of source points to a set of receivers.
+
+       distance is (nx, ny, nz, receivers, PATHS) and planes (nx, ny, nz, PATHS), the plane each
+       path is mirrored in, with nan for the paths a grid point doesn't have. Grid point (i, j, k)
+       is at origin + spacing*(i, j, k).
+    """
+    reflectedFraction = ImageSourceTree.reflectedFraction
+
+    def __init__(self, origin, spacing, receivers, distance, planes):
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.spacing = float(spacing)
+        self.receivers = np.asarray(receivers, dtype=np.float64).reshape(-1, 3)
+        self.distance = distance
+        self.planes = planes
+        self.shape = np.array(planes.shape[:3])
+
+    @classmethod
+    def build(cls, obstacleList, receivers, spacing):
+        receivers = np.asarray(receivers, dtype=np.float64).reshape(-1, 3)
+        lower, upper = obstacleBounds(obstacleList)
+        shape = tuple(np.ceil((upper - lower)/spacing).astype(int) + 1)
+        axes = [lower[k] + spacing*np.arange(shape[k]) for k in range(3)]
+        points = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+        planes = firstPlanes(*ReflectingSurfaces(obstacleList).nearestPlanesOf(points))
+        distance = np.empty((len(points), len(receivers), PATHS))
+        for start in range(0, len(points), 4096):
+            chunk = slice(start, start + 4096)
+            distance[chunk] = imageLengths(points[chunk], planes[chunk], receivers)
+        return cls(lower, spacing, receivers, distance.reshape(shape + distance.shape[1:]), planes.reshape(shape + (PATHS,)))
+
+    @classmethod
+    def load(cls, path):
+        saved = np.load(path)
+        return cls(saved['origin'], float(saved['spacing']), saved['receivers'], saved['distance'], saved['planes'])
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(f, origin=self.origin, spacing=self.spacing, receivers=self.receivers,
+                     distance=self.distance, planes=self.planes)
+
+    def nbytes(self):
+        return self.distance.nbytes + self.planes.nbytes
+
+    def lookup(self, point, planes):
+        """ Length of each reflected path from point to every receiver (receivers x PATHS, nan
+            where there is no such path), given the planes point is mirrored in (see firstPlanes),
+            or None if point is outside the grid. A path is interpolated between the grid points
+            around point if they are all mirrored in the same plane as point. Otherwise point is
+            right by an obstacle, and interpolating would mix up paths off different planes, so it
+            is worked out from scratch. """
+        distance, inside = self.lookupOf(np.asarray(point, dtype=np.float64)[None, :], np.asarray(planes)[None, :])
+        if not inside[0]:
+            return None
+        return distance[0]
+
+    def lookupOf(self, points, planes):
+        """ lookup for each of points at once, with planes as (points x PATHS). Returns the path
+            lengths as (points x receivers x PATHS), and which points are inside the grid (the
+            lengths of the others are nan). """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        planes = np.asarray(planes, dtype=np.float64).reshape(-1, PATHS)
+        u = (points - self.origin)/self.spacing
+        inside = ((u >= 0) & (u <= self.shape - 1)).all(axis=1)
+        distance = np.full((len(points), len(self.receivers), PATHS), np.nan)
+        if not inside.any():
+            return distance, inside
+        points = points[inside]
+        u = u[inside]
+        planes = planes[inside]
+        base = np.minimum(np.floor(u).astype(int), np.maximum(self.shape - 2, 0))
+        frac = u - base
+        weights = np.where(corners[None, :, :], frac[:, None, :], 1 - frac[:, None, :]).prod(axis=2) # points x corners
+        used = weights > 0
+        nodes = tuple(np.minimum(base[:, None, :] + corners[None, :, :], self.shape - 1).transpose(2, 0, 1))
+        # corners with no weight may not even have the path, so they mustn't add a nan
+        found = np.where(used[:, :, None, None], weights[:, :, None, None]*self.distance[nodes], 0.0).sum(axis=1)
+        agree = ((self.planes[nodes] == planes[:, None, :]) | ~used[:, :, None]).all(axis=1)
+        missing = ~agree & ~np.isnan(planes)
+        redo = np.flatnonzero(missing.any(axis=1))
+        if len(redo) > 0:
+            exact = imageLengths(points[redo], planes[redo], self.receivers)
+            found[redo] = np.where(missing[redo][:, None, :], exact, found[redo])
+        found[np.broadcast_to(np.isnan(planes)[:, None, :], found.shape)] = np.nan
+        distance[inside] = found
+        return distance, inside
+
+def tableKey(obstacleList, receivers, spacing):
+    """ Hash of everything a table depends on """
+    digest = layoutDigest(obstacleList, tableVersion, ResponseTable.reflectedFraction, float(spacing))
+    digest.update(np.round(np.asarray(receivers, dtype=np.float64), 6).tobytes())
+    return digest.hexdigest()
+
+
+def cachedTable(obstacleList, receivers, spacing, cacheDir):
+    """ The table for this layout, receivers and grid, from cacheDir if it was built before.
+        Otherwise it is built, and saved there for next time. """
+    path = None
+    if cacheDir:
+        path = os.path.join(cacheDir, 'response-%s.npz' % tableKey(obstacleList, receivers, spacing))
+        if os.path.exists(path):
+            return ResponseTable.load(path)
+    table = ResponseTable.build(obstacleList, receivers, spacing)
+    if path is not None:
+        try:
+            if not os.path.isdir(cacheDir):
+                os.makedirs(cacheDir)
+            table.save(path)
+        except (IOError, OSError):
+            pass # still good for this run
+    return table
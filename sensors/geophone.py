@@ -3,9 +3,11 @@ import logging
 
 class Geophone(FieldObject):
     """Ground vibration sensor""" 
+    pushesEmissions = True # it never radiates, so there is nothing to poll
     def __init__(self, entity, params):
         self.device = entity
         self.decayRate = params.get('decayRate', 10.0)
+        self.isStatic = params.get('static', 'false').lower() == 'true'
         self.device.environment.addFieldObject('Vibration', self)
         self.value = 0
         self.flagged = False
@@ -29,4 +31,7 @@ class Geophone(FieldObject):
     def getPosition(self):
         return self.device.physicsBody.getPosition()
 
+    def getVelocity(self):
+        return self.device.physicsBody.getLinearVel()
+
 
@@ -4,6 +4,7 @@ import numpy
 
 class Radio(FieldObject):
     """A very simple radio implementation"""
+    pushesEmissions = True
     def __init__(self, entity, params):
         self.device = entity
 
@@ -22,7 +23,6 @@ class Radio(FieldObject):
         self.environment = self.device.environment
         self.device.environment.addFieldObject('RF', self)
         self.lastRssi = 0
-        self.emissionQueue = []
 
     def getRssi(self):
         return self.lastRssi
@@ -33,8 +33,8 @@ class Radio(FieldObject):
 
     def writePacket(self, t, address, channel, message):
         # ignore message
-        toEmit = (self.transFrequency, self.tx_power, t)
-        self.emissionQueue.append(toEmit)
+        frequency = self.transFrequency + (channel - self.channel)*1e6 # tune to the channel we send on
+        self.environment.pushFieldEmission('RF', self, frequency, self.tx_power, t)
 
 
     def detectField(self, fieldValue):
@@ -44,18 +44,15 @@ class Radio(FieldObject):
             self.lastRssi = 10*numpy.log10(1000*intensity)
             #TODO: check address... ?!
 
-    def getRadiatedValues(self):
-        outVals = []
-        now = self.environment.time
-        for e in self.emissionQueue[:]:
-            if e[2] <= now:
-                outVals.append(e)
-                self.emissionQueue.remove(e)
-        return outVals
-
     def getPosition(self):
         return self.device.physicsBody.getPosition()
 
+    def getVelocity(self):
+        return self.device.physicsBody.getLinearVel()
+
+    def getSensitivity(self):
+        return self.rx_sensitivity
+
 
 
 
@@ -1,4 +1,4 @@
-from field_types import FieldObject
+from field_types import FieldObject, payloadList
 import numpy
 from random import randint
 
@@ -10,13 +10,13 @@ class RadioPacket:
 
 class SemanticRadio(FieldObject):
     """ A 'radio wave' representation where symbols are associated with wavefronts"""
+    pushesEmissions = True
     def __init__(self, entity, params):
         self.device = entity
         self.transFrequency = float(params.get('frequency', 2.4e9))
         self.rx_sensitivity = float(params.get('rx_sens', 2.5e-13)) # in W, for nrf51
         self.tx_power = float(params.get('tx_pow', 0.0001)) # nrf51
         self.inBuffer = [] # list of RadioPackets
-        self.outBuffer = []
         self.lastRssi = 0
         self.channel = int(params['channel'])
         self.transFrequency += self.channel*1e6
@@ -33,18 +33,20 @@ class SemanticRadio(FieldObject):
     def detectField(self, fieldValue):
         """Register any readings, if necessary. fieldvalue is a FieldSphere """
         intensity = fieldValue.intensity
-        packet = fieldValue.data
         if intensity >= self.rx_sensitivity:
-            # TODO: multiple addresses + channels possible!
-            if packet.address == self.address and packet.channel == self.channel:
-                self.inBuffer.append(packet.message) # TODO: timestamp? 
-                newRssi = 10*numpy.log10(1000*intensity)
-                self.lastRssi = newRssi
+            # the field may have coalesced several packets into one wavefront
+            for packet in payloadList(fieldValue.data):
+                # TODO: multiple addresses + channels possible!
+                if packet.address == self.address and packet.channel == self.channel:
+                    self.inBuffer.append(packet.message) # TODO: timestamp?
+                    newRssi = 10*numpy.log10(1000*intensity)
+                    self.lastRssi = newRssi
 
 
     def writePacket(self, t, address, channel, message):
         pack = RadioPacket(address, channel, message)
-        self.outBuffer.append(((self.transFrequency, self.tx_power, t), pack))
+        frequency = self.transFrequency + (channel - self.channel)*1e6 # tune to the channel we send on
+        self.device.environment.pushFieldEmission('RF_Semantic', self, frequency, self.tx_power, t, pack)
 
     def isAvailable(self):
         return len(self.inBuffer) > 0
@@ -52,14 +54,6 @@ class SemanticRadio(FieldObject):
     def readPacket(self, nBytes=-1):
         return self.inBuffer.pop()
 
-    def getRadiatedValues(self):
-        if len(self.outBuffer) > 0:
-            outPackets = [p for p in self.outBuffer if self.device.environment.time >= p[0][2]]
-            self.outBuffer = [p for p in self.outBuffer if p not in outPackets]
-            return outPackets
-        return [(None, None)]
-
-
     def getPendingEmission(self):
         if len(self.emissionQueue) == 0:
             return None
@@ -77,4 +71,16 @@ class SemanticRadio(FieldObject):
         #        self.emissionQueue.remove(val)
 
     def getPosition(self):
-        return self.device.physicsBody.getPosition()
\ No newline at end of file
+        return self.device.physicsBody.getPosition()
+
+    def getVelocity(self):
+        return self.device.physicsBody.getLinearVel()
+
+    def getSensitivity(self):
+        return self.rx_sensitivity
+
+    def getBand(self):
+        return self.transFrequency
+
+    def getAddress(self):
+        return self.address
\ No newline at end of file
@@ -0,0 +1,118 @@
+import numpy as np
+from multiprocessing import Pool
+from multiprocessing.sharedctypes import RawArray
+from field_kernels import getKernels
+
+def testPairs(kernels, columns, pairState, rows, grid, positions, pos2, previous, prev2, sensitivity, slots=None, now=None):
+    """ Test the fronts in rows against the receivers bucketed in grid, with each receiver's position
+        now and at the last update, and their squared norms in pos2/prev2. pairState holds the
+        next-check time of each (row, receiver slot) pair, or is None to test every candidate.
+        Returns the tested (row, receiver) pairs, which of them the front crossed strongly enough
+        for the receiver to register, and their squared distances now. """
+    # only test receivers in grid cells that the shell passes through
+    pairRows, pairReceivers = grid.query(columns.centers[rows], columns.lastRadius[rows], columns.radius[rows])
+    pairRows = rows[pairRows]
+    # a front only crosses receivers beyond its last radius, so it may already be too weak for them
+    strength = columns.power[pairRows]*columns.intensityFactor[pairRows]
+    lastR = columns.lastRadius[pairRows]
+    keep = strength >= sensitivity[pairReceivers]*lastR*lastR
+    if pairState is not None:
+        # and only once the front could possibly have reached them
+        keep[keep] = pairState[pairRows[keep], slots[pairReceivers[keep]]] <= now
+    pairRows = pairRows[keep]
+    pairReceivers = pairReceivers[keep]
+    strength = strength[keep]
+    hit, newDist = kernels.crossings(columns, pairRows, positions[pairReceivers], pos2[pairReceivers],
+                                     previous[pairReceivers], prev2[pairReceivers])
+    # and it has to be strong enough to register where it crosses them
+    hit &= strength >= sensitivity[pairReceivers]*newDist
+    return pairRows, pairReceivers, hit, newDist
+
+
+_shared = {} # the shared memory blocks, in a worker process
+
+def _attach(f64, f32, backend):
+    _shared['f64'] = f64
+    _shared['f32'] = f32
+    _shared['kernels'] = getKernels(backend)
+
+class _SharedColumns(object):
+    def __init__(self, layout):
+        f64 = np.frombuffer(_shared['f64'], dtype=np.float64)
+        for name, start, shape in layout:
+            setattr(self, name, f64[start:start+int(np.prod(shape))].reshape(shape))
+        self.wasActive = self.wasActive != 0
+
+def _runShard(task):
+    layout, pairShape, rows, grid, positions, pos2, previous, prev2, sensitivity, slots, now = task
+    pairState = None
+    if pairShape is not None:
+        f32 = np.frombuffer(_shared['f32'], dtype=np.float32)
+        pairState = f32[:pairShape[0]*pairShape[1]].reshape(pairShape)
+    return testPairs(_shared['kernels'], _SharedColumns(layout), pairState, rows, grid, positions, pos2, previous, prev2,
+                     sensitivity, slots, now)
+
+
+class ShardedIntersector(object):
+    """Runs a field's wavefront/receiver tests, sharded by wavefront across worker processes.
+
+       Every update, the columns the tests need are copied into shared memory that the workers
+       attached to when they started, so only the shard bounds, the receivers and the grid get
+       pickled. Results come back in shard order, so the merge doesn't depend on which worker
+       finishes first. With fewer than two workers, or too few fronts to split, the tests run
+       in this process.
+    """
+    columns = ('centers', 'center2', 'radius', 'lastRadius', 'wasActive', 'activation', 'power', 'intensityFactor')
+    minShardRows = 2048
+
+    def __init__(self, workers=0, kernels=None):
+        self.workers = int(workers)
+        self.kernels = getKernels() if kernels is None else kernels
+        self.pool = None
+        self._f64 = None
+        self._f32 = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def _reserve(self, n64, n32):
+        """ Make sure the shared blocks hold n64 doubles and n32 floats; workers are restarted to attach to new ones """
+        if self.pool is not None and len(self._f64) >= n64 and len(self._f32) >= n32:
+            return
+        self.close()
+        if self._f64 is not None:
+            n64 = max(n64, 2*len(self._f64))
+            n32 = max(n32, 2*len(self._f32))
+        self._f64 = RawArray('d', max(n64, 1))
+        self._f32 = RawArray('f', max(n32, 1))
+        self.pool = Pool(self.workers, _attach, (self._f64, self._f32, self.kernels.name))
+
+    def run(self, table, grid, rows, positions, pos2, previous, prev2, sensitivity, slots=None, now=None):
+        """ testPairs for the fronts in rows of table; slots (receiver ids) are needed to use the pair state """
+        pairState = table.pairState() if slots is not None else None
+        nShards = min(self.workers, len(rows)//self.minShardRows)
+        if nShards < 2:
+            return testPairs(self.kernels, table, pairState, rows, grid, positions, pos2, previous, prev2, sensitivity, slots, now)
+
+        n64 = sum(getattr(table, name).size for name in self.columns)
+        n32 = 0 if pairState is None else pairState.size
+        self._reserve(n64, n32)
+        f64 = np.frombuffer(self._f64, dtype=np.float64)
+        layout = []
+        start = 0
+        for name in self.columns:
+            col = getattr(table, name)
+            f64[start:start+col.size] = col.ravel()
+            layout.append((name, start, col.shape))
+            start += col.size
+        pairShape = None
+        if pairState is not None:
+            np.frombuffer(self._f32, dtype=np.float32)[:pairState.size] = pairState.ravel()
+            pairShape = pairState.shape
+
+        tasks = [(layout, pairShape, shard, grid, positions, pos2, previous, prev2, sensitivity, slots, now)
+                 for shard in np.array_split(rows, nShards)]
+        results = self.pool.map(_runShard, tasks)
+        return tuple(np.concatenate(part) for part in zip(*results))
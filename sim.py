@@ -28,6 +28,12 @@ def runSimulationFile(filename, withViz, timeout=None):
     if withViz:
         logger.info('FPS: {}'.format(sim.visualizer.fpsValues)) 
 
+    for name, f in sim.fieldList.items():
+        try:
+            logger.info('{} field: {}'.format(name, f.memoryUsage()))
+        except AttributeError:
+            pass # not every field reports it
+
     del sim
     return (simTime, realTime)
 
@@ -0,0 +1,109 @@
+import hashlib
+import numpy as np
+
+def layoutDigest(obstacleList, *extra):
+    """ sha1 hex digest of the obstacles' outlines (and any extra values), for keying caches of what was worked out for a layout """
+    digest = hashlib.sha1()
+    digest.update(repr(extra).encode('ascii'))
+    for obs in obstacleList:
+        outline = ([round(float(x), 6) for x in obs.centerPos], [round(float(x), 6) for x in obs.dim],
+                   sorted((int(axis), round(float(at), 6)) for axis, at in obs.faces))
+        digest.update(repr(outline).encode('ascii'))
+    return digest
+
+def obstacleBounds(obstacleList, positions=None):
+    """ Lower and upper corners of the box around the obstacles (and any points given), or None if there is nothing """
+    corners = []
+    for obs in obstacleList:
+        half = np.divide(obs.dim, 2.0)
+        corners.append(np.subtract(obs.centerPos, half))
+        corners.append(np.add(obs.centerPos, half))
+    if positions is not None and len(positions) > 0:
+        corners.extend(positions)
+    if len(corners) == 0:
+        return None
+    corners = np.array(corners, dtype=np.float64)
+    return corners.min(axis=0), corners.max(axis=0)
+
+class ReceiverGrid(object):
+    """Uniform grid over the receivers of a field.
+
+       The grid spans the layout extents. Receivers are bucketed into its
+       cells on every refit, and each occupied cell keeps the tight bounding
+       box of the receivers in it. A wavefront then only needs exact tests
+       against receivers in cells whose box overlaps its shell.
+    """
+    defaultDivisions = 8
+    rowBlock = 2048 # wavefronts tested against the cells at once, bounds the temporaries
+
+    def __init__(self, lower, upper, cellSize=None):
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        extent = np.maximum(self.upper - self.lower, 1e-6)
+        if cellSize is None:
+            cellSize = extent.max()/self.defaultDivisions
+        self.cellSize = float(cellSize)
+        self.shape = tuple(np.maximum(np.ceil(extent/self.cellSize).astype(int), 1))
+        self.refit(np.zeros((0,3)))
+
+    @classmethod
+    def fromObstacles(cls, obstacleList, positions=None, cellSize=None):
+        """ Size the grid from the bounding box of the obstacles (and any receivers outside of it) """
+        bounds = obstacleBounds(obstacleList, positions)
+        if bounds is None:
+            bounds = (np.zeros(3), np.zeros(3))
+        return cls(bounds[0], bounds[1], cellSize)
+
+    def refit(self, positions, displacement=None):
+        """ Rebucket the receivers. displacement is how far each receiver moved since the last refit """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        n = len(positions)
+        if displacement is None:
+            displacement = np.zeros(n)
+        # anything outside the layout goes in the border cells; the tight boxes keep that correct
+        cell = np.floor((positions - self.lower)/self.cellSize).astype(int)
+        cell = np.clip(cell, 0, np.array(self.shape)-1)
+        flat = np.ravel_multi_index(cell.T, self.shape) if n > 0 else np.zeros(0, dtype=int)
+        occupied, self.receiverCell = np.unique(flat, return_inverse=True)
+        self.receiverCell = self.receiverCell.reshape(-1)
+        nCells = len(occupied)
+
+        self.members = np.argsort(self.receiverCell, kind='mergesort')
+        self.cellCount = np.bincount(self.receiverCell, minlength=nCells)
+        self.cellStart = np.cumsum(self.cellCount) - self.cellCount
+
+        self.cellLow = np.full((nCells, 3), np.inf)
+        self.cellHigh = np.full((nCells, 3), -np.inf)
+        np.minimum.at(self.cellLow, self.receiverCell, positions)
+        np.maximum.at(self.cellHigh, self.receiverCell, positions)
+        # how far a receiver in the cell could have been from its current position at the last refit
+        self.cellSlack = np.zeros(nCells)
+        np.maximum.at(self.cellSlack, self.receiverCell, displacement)
+
+    def query(self, centers, lastRadius, radius):
+        """ Candidate (wavefront, receiver) pairs: receivers in cells whose box reaches the shell between
+            lastRadius and radius around each center. Returns (rows, receivers) index arrays. """
+        nCells = len(self.cellCount)
+        rowParts = []
+        receiverParts = []
+        if nCells == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        for b in range(0, len(centers), self.rowBlock):
+            c = centers[b:b+self.rowBlock, None, :]
+            gap = np.maximum(np.maximum(self.cellLow[None] - c, c - self.cellHigh[None]), 0)
+            nearest = np.einsum('ijk,ijk->ij', gap, gap)
+            spread = np.maximum(np.abs(c - self.cellLow[None]), np.abs(c - self.cellHigh[None]))
+            farthest = np.sqrt(np.einsum('ijk,ijk->ij', spread, spread)) + self.cellSlack[None]
+            r = radius[b:b+self.rowBlock, None]
+            lastR = lastRadius[b:b+self.rowBlock, None]
+            rows, cells = np.nonzero((nearest <= r*r) & (farthest > lastR))
+            if len(rows) == 0:
+                continue
+            # expand each (row, cell) pair into the receivers of that cell
+            counts = self.cellCount[cells]
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            rowParts.append(np.repeat(rows + b, counts))
+            receiverParts.append(self.members[np.repeat(self.cellStart[cells], counts) + offsets])
+        if len(rowParts) == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        return np.concatenate(rowParts), np.concatenate(receiverParts)
@@ -0,0 +1,70 @@
+"""Stand-ins for the simulation around a field, so fields can be tested without a physics world.
+
+   Run the tests from the top of the package with python -m unittest discover -s tests
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from field_types import FieldObject
+
+class FakeObstacle(object):
+    def __init__(self, faces, centerPos, dim):
+        self.faces = list(faces)
+        self.centerPos = tuple(centerPos)
+        self.dim = tuple(dim)
+
+def planeWall(axis, at, size=10.0):
+    """ A thin wall across axis at the given coordinate, reflecting off its middle plane like wall.Wall """
+    center = [0.0, 0.0, 0.0]
+    center[axis] = at
+    dim = [size, size, size]
+    dim[axis] = 0.05
+    return FakeObstacle([(axis, at)], center, dim)
+
+class FakeEnvironment(object):
+    def __init__(self, obstacleList=(), dt=0.025):
+        self.obstacleList = list(obstacleList)
+        self.dt = dt
+        self.time = 0.0
+        self.layoutVersion = 0
+
+class FakeReceiver(FieldObject):
+    """Logs what it is delivered, as (time, field value)"""
+    pushesEmissions = True
+    def __init__(self, environment, position, isStatic=True, sensitivity=0.0, band=None, velocity=(0.0, 0.0, 0.0)):
+        self.environment = environment
+        self.position = tuple(position)
+        self.isStatic = isStatic
+        self.sensitivity = sensitivity
+        self.band = band
+        self.velocity = velocity
+        self.log = []
+
+    def getPosition(self):
+        return self.position
+
+    def getVelocity(self):
+        return self.velocity
+
+    def getSensitivity(self):
+        return self.sensitivity
+
+    def getBand(self):
+        return self.band
+
+    def detectField(self, fieldValue):
+        self.log.append((round(self.environment.time, 6), fieldValue))
+
+def recording(fieldClass):
+    """ fieldClass, delivering every hit it combines as (arrival time, intensity, phase shift), sorted """
+    class RecordingField(fieldClass):
+        def combineValues(self, sphereList):
+            return sorted((round(float(s.tArr), 6), round(float(s.intensity), 9), round(float(s.phaseShift), 6))
+                          for s in sphereList)
+    return RecordingField
+
+def runField(field, environment, steps):
+    for _ in range(steps):
+        field.update(environment.time)
+        environment.time += environment.dt
@@ -0,0 +1,65 @@
+import unittest
+from field_fakes import FakeEnvironment, FakeReceiver, planeWall, recording, runField
+import tempfile
+import shutil
+from field_types import Field, TabulatedField
+
+class InstantField(recording(Field)):
+    def propagatesInstantly(self):
+        return True
+
+class BehindWallTest(unittest.TestCase):
+    """A receiver behind a wall must not hear the wall's echo, whether it is static or moving"""
+    def deliveries(self, isStatic, x=1.5, fieldClass=recording(Field)):
+        env = FakeEnvironment([planeWall(0, 1.0)])
+        field = fieldClass(20.0, minI=1e-6)
+        field.environment = env
+        receiver = FakeReceiver(env, (x, 0.0, 0.0), isStatic=isStatic)
+        field.addObject(receiver)
+        source = FakeReceiver(env, (0.0, 0.0, 0.0))
+        field.pushEmission(source, 1.0, 10.0, 0.0)
+        runField(field, env, 20)
+        return [hits for t, hits in receiver.log]
+
+    def test_static_receiver_hears_only_the_direct_front(self):
+        hits = [hit for delivery in self.deliveries(True) for hit in delivery]
+        self.assertEqual(len(hits), 1)
+        tArr, intensity, phaseShift = hits[0]
+        self.assertAlmostEqual(tArr, 1.5/20.0)
+        self.assertEqual(phaseShift, 0.0)
+        self.assertAlmostEqual(intensity, 10.0*0.75/1.5**2, places=6) # past the reflection
+
+    def test_static_and_moving_receivers_agree(self):
+        self.assertEqual(self.deliveries(True), self.deliveries(False))
+
+    def test_far_behind_the_wall_only_the_direct_front_arrives(self):
+        # the echo's image is at x=2, so it would get to x=4 first, out of phase
+        expected = [[(0.2, round(10.0*0.75/16, 9), 0.0)]]
+        self.assertEqual(self.deliveries(True, 4.0), expected)
+        self.assertEqual(self.deliveries(False, 4.0), expected)
+        self.assertEqual(self.deliveries(True, 4.0, InstantField), expected)
+
+    def test_tabulated_receiver_behind_the_wall(self):
+        cacheDir = tempfile.mkdtemp()
+        try:
+            fieldClass = recording(TabulatedField)
+            tabulated = lambda speed, minI: fieldClass(speed, minI, cacheDir=cacheDir)
+            hits = [hit for delivery in self.deliveries(True, 4.0, tabulated) for hit in delivery]
+        finally:
+            shutil.rmtree(cacheDir)
+        self.assertEqual([(tArr, phaseShift) for tArr, intensity, phaseShift in hits], [(0.2, 0.0)])
+
+    def test_receiver_in_front_of_the_wall_hears_the_echo(self):
+        env = FakeEnvironment([planeWall(0, 1.0)])
+        field = recording(Field)(20.0, minI=1e-6)
+        field.environment = env
+        receiver = FakeReceiver(env, (0.5, 0.0, 0.0))
+        field.addObject(receiver)
+        field.pushEmission(FakeReceiver(env, (0.0, 0.0, 0.0)), 1.0, 10.0, 0.0)
+        runField(field, env, 20)
+        phases = sorted(hit[2] for t, hits in receiver.log for hit in hits)
+        self.assertEqual(len(phases), 2)
+        self.assertAlmostEqual(phases[1], 3.141593)
+
+if __name__ == '__main__':
+    unittest.main()
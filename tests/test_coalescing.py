@@ -0,0 +1,35 @@
+import unittest
+from field_fakes import FakeEnvironment, FakeReceiver
+from field_types import Field
+
+class CoalescingTest(unittest.TestCase):
+    def setUp(self):
+        self.env = FakeEnvironment()
+        self.field = Field(20.0, coalesceWindow=0.1)
+        self.field.environment = self.env
+        self.source = FakeReceiver(self.env, (1.0, 2.0, 3.0))
+
+    def test_bursts_from_one_source_share_a_wavefront(self):
+        self.field.pushEmission(self.source, 1.0, 2.0, 0.0, 'a')
+        self.field.pushEmission(self.source, 1.0, 5.0, 0.05, 'b')
+        self.assertEqual(self.field.readyEmissions(0.05), []) # window still open
+        ready = self.field.readyEmissions(0.1)
+        self.assertEqual(len(ready), 1)
+        o, pos, freq, power, t, data = ready[0]
+        self.assertIs(o, self.source)
+        self.assertEqual((pos, power, t), ((1.0, 2.0, 3.0), 5.0, 0.0))
+        self.assertEqual(list(data), ['a', 'b'])
+
+    def test_other_bands_are_kept_apart(self):
+        self.field.pushEmission(self.source, 1.0, 2.0, 0.0)
+        self.field.pushEmission(self.source, 3*Field.bandWidth, 2.0, 0.0)
+        self.assertEqual(len(self.field.readyEmissions(0.1)), 2)
+
+    def test_placed_emissions_are_never_merged(self):
+        # e.g. two walkers of one crowd stepping at once, in different places
+        self.field.pushEmissions(self.source, 360.0, [1.0, 2.0], [0.0, 0.01], [(0, 0, 0), (4, 0, 0)])
+        ready = self.field.readyEmissions(0.01)
+        self.assertEqual(sorted((e[1], e[3]) for e in ready), [((0, 0, 0), 1.0), ((4, 0, 0), 2.0)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import numpy as np
+import field_fakes
+from bodies import CrowdStepper
+
+class CrowdEnvironment(object):
+    lengthScale = 1.0
+    def __init__(self):
+        self.time = 0.0
+        self.pushed = [] # (time, step times) of each batch
+
+    def pushFieldEmissions(self, fieldName, o, freq, powers, times, positions=None):
+        self.pushed.append((self.time, np.array(times)))
+
+class CrowdStepperTest(unittest.TestCase):
+    def crowd(self):
+        env = CrowdEnvironment()
+        crowd = CrowdStepper.__new__(CrowdStepper) # no physics world to make a body in
+        crowd.environment = env
+        crowd.applyParameters({'walkers': '20', 'duration': '10', 'seed': '1'})
+        return env, crowd
+
+    def test_every_step_is_pushed_once(self):
+        env, crowd = self.crowd()
+        # uneven updates, some landing right on a step
+        times = np.concatenate([np.cumsum(np.random.RandomState(2).uniform(0.001, 0.05, 400)), crowd.stepTimes[::7]])
+        for t in np.unique(times):
+            env.time = t
+            crowd.updatePhysics(0.0)
+        env.time = 11.0
+        crowd.updatePhysics(0.0)
+        pushed = np.concatenate([steps for t, steps in env.pushed])
+        np.testing.assert_array_equal(pushed, crowd.stepTimes)
+        # each once it has happened, and no later than the first update after it
+        updates = np.array([t for t, steps in env.pushed for _ in steps])
+        self.assertTrue((pushed <= updates).all())
+        previous = np.concatenate([[-np.inf], [t for t, _ in env.pushed][:-1]])
+        self.assertTrue(all((steps > before).all() for (t, steps), before in zip(env.pushed, previous)))
+
+    def test_nothing_is_pushed_between_steps(self):
+        env, crowd = self.crowd()
+        env.time = crowd.stepTimes[0]
+        crowd.updatePhysics(0.0)
+        crowd.updatePhysics(0.0) # the same time again
+        self.assertEqual(len(env.pushed), 1)
+        self.assertEqual(len(env.pushed[0][1]), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from field_fakes import FakeEnvironment, FakeReceiver
+from field_types import EmissionQueue, RayField
+
+class EmissionQueueTest(unittest.TestCase):
+    def test_batches_come_due_in_order_with_single_emissions(self):
+        queue = EmissionQueue()
+        a, b = object(), object()
+        queue.push(a, 1.0, 1.0, 0.15, 'x')
+        queue.pushBatch(b, 2.0, [3.0, 0.0, 1.0, 2.0], [0.3, 0.1, 0.1, 0.2], [(3, 0, 0), (9, 9, 9), (1, 0, 0), (2, 0, 0)])
+        self.assertEqual(len(queue), 4) # the silent one is dropped
+        self.assertEqual(queue.pop(0.05), [])
+        due = queue.pop(0.2)
+        self.assertEqual([(e[0], e[3], e[5]) for e in due], [(b, 0.1, (1.0, 0.0, 0.0)), (a, 0.15, None),
+                                                             (b, 0.2, (2.0, 0.0, 0.0))])
+        self.assertEqual(len(queue), 1)
+        self.assertEqual([e[2] for e in queue.pop(1.0)], [3.0])
+        self.assertEqual(len(queue), 0)
+
+    def test_discarding_a_source_drops_its_batches(self):
+        queue = EmissionQueue()
+        a, b = object(), object()
+        queue.pushBatch(a, 1.0, [1.0, 1.0], [0.0, 1.0])
+        queue.pushBatch(b, 1.0, [1.0], [0.5])
+        queue.discardSource(a)
+        self.assertEqual(len(queue), 1)
+        self.assertEqual([(e[0], e[5]) for e in queue.pop(2.0)], [(b, None)])
+
+class RayFieldOriginTest(unittest.TestCase):
+    def test_pushed_positions_are_traced_from(self):
+        env = FakeEnvironment()
+        field = RayField(20.0, dPhi=4, dTheta=4, tracer='numpy') # fine enough to hit a small receiver
+        receiver = FakeReceiver(env, (5.0, 0.0, 0.0))
+        source = FakeReceiver(env, (0.0, 0.0, 0.0))
+        field.addObject(receiver)
+        field.addObject(source)
+        field.pushEmissions(source, 1.0, [10.0], [0.0], [(4.0, 0.0, 0.0)])
+        field.update(0.1)
+        value = receiver.log[-1][1]
+        self.assertEqual(value.center, (4.0, 0.0, 0.0))
+        self.assertAlmostEqual(value.tArr, 1.0/20.0, places=2)
+
+    def test_sources_outside_the_field_are_traced(self):
+        env = FakeEnvironment()
+        field = RayField(20.0, dPhi=4, dTheta=4, tracer='numpy')
+        receiver = FakeReceiver(env, (5.0, 0.0, 0.0))
+        field.addObject(receiver)
+        crowd = object() # only pushes, e.g. a CrowdStepper
+        field.pushEmissions(crowd, 1.0, [10.0], [0.0], [(4.0, 0.0, 0.0)])
+        field.update(0.1)
+        self.assertEqual(receiver.log[-1][1].center, (4.0, 0.0, 0.0))
+        field.update(1e6) # long faded away
+        self.assertEqual(field.emitters, {})
+
+if __name__ == '__main__':
+    unittest.main()
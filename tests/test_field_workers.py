@@ -0,0 +1,48 @@
+import unittest
+from field_fakes import FakeEnvironment, FakeReceiver, planeWall, recording
+from field_types import Field
+from field_workers import FieldWorker
+from geometry_frame import GeometryFrame
+
+class PipelinedWorkerTest(unittest.TestCase):
+    """A field in a worker delivers what the field itself would, even when its last update is
+       only delivered on closing"""
+    def run_field(self, inWorker, steps):
+        env = FakeEnvironment([planeWall(0, 3.0)])
+        field = recording(Field)(20.0, 1e-4)
+        field.environment = env
+        receivers = [FakeReceiver(env, (x, 0.0, 0.0), isStatic=(x > 0)) for x in (-1.0, 1.0, 2.0)]
+        for r in receivers:
+            field.addObject(r)
+        worker = FieldWorker(field) if inWorker else None
+        source = FakeReceiver(env, (0.0, 0.0, 0.0))
+        field.pushEmissions(source, 1.0, [5.0, 6.0], [0.0, 0.02])
+        for _ in range(steps):
+            env.geometryFrame = GeometryFrame(env.time)
+            if inWorker:
+                worker.deliver() # the last update's, one step late
+                worker.send(env.time, env.geometryFrame, env.obstacleList)
+            else:
+                field.update(env.time)
+            env.time += env.dt
+        if inWorker:
+            worker.close()
+        return [r.log for r in receivers]
+
+    def test_closing_delivers_the_last_update(self):
+        steps = 4 # the direct fronts reach the far receiver on the last one
+        expected = self.run_field(False, steps)
+        self.assertTrue(any(t == round(FakeEnvironment().dt*(steps - 1), 6) for log in expected for t, _ in log))
+        self.assertEqual([[hits for _, hits in log] for log in self.run_field(True, steps)],
+                         [[hits for _, hits in log] for log in expected])
+
+class FieldCloseTest(unittest.TestCase):
+    def test_closing_stops_the_intersector_pool(self):
+        field = Field(20.0, workers=2)
+        field.intersector._reserve(16, 16) # as the first sharded run does
+        self.assertIsNotNone(field.intersector.pool)
+        field.close()
+        self.assertIsNone(field.intersector.pool)
+
+if __name__ == '__main__':
+    unittest.main()
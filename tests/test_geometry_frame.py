@@ -0,0 +1,34 @@
+import unittest
+import numpy as np
+from field_fakes import FakeEnvironment, FakeReceiver
+from geometry_frame import GeometryFrame
+
+class GeometryFrameTest(unittest.TestCase):
+    def setUp(self):
+        env = FakeEnvironment()
+        self.receivers = [FakeReceiver(env, p) for p in ((1.0, 0.0, 0.0), (0.0, 2.0, 0.0), (0.0, 0.0, 3.0))]
+        self.frame = GeometryFrame(0.0)
+
+    def expected(self, points, receivers):
+        offsets = np.asarray(points, dtype=np.float64)[:, None, :] - np.array([r.position for r in receivers])[None, :, :]
+        return (offsets**2).sum(axis=2)
+
+    def test_points_are_shared_between_batches(self):
+        rows = self.frame.locate(self.receivers)
+        first = [(0.0, 0.0, 0.0), (1.0, 1.0, 1.0)]
+        np.testing.assert_allclose(self.frame.squaredDistances(first, rows), self.expected(first, self.receivers))
+        cached = self.frame._distances[np.array(first[1]).tobytes()]
+        second = [(1.0, 1.0, 1.0), (2.0, 0.0, 0.0)] # another field, spawning from one of the same points
+        np.testing.assert_allclose(self.frame.squaredDistances(second, rows[::-1]),
+                                   self.expected(second, self.receivers[::-1]))
+        self.assertIs(self.frame._distances[np.array(first[1]).tobytes()], cached)
+
+    def test_receivers_located_later_are_measured(self):
+        points = [(0.0, 0.0, 0.0)]
+        self.frame.squaredDistances(points, self.frame.locate(self.receivers[:1]))
+        rows = self.frame.locate(self.receivers)
+        np.testing.assert_allclose(self.frame.squaredDistances(points, rows), self.expected(points, self.receivers))
+        self.assertEqual(self.frame.squaredDistances([], rows).shape, (0, 3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from field_fakes import FakeEnvironment, FakeReceiver, planeWall, runField
+from field_types import SemanticField
+import heatmap
+from heatmap import coverageMap
+
+def room():
+    return [planeWall(0, 3.0), planeWall(1, -1.5)]
+
+class Radio(FakeReceiver):
+    def getAddress(self):
+        return None
+
+class CoverageMapTest(unittest.TestCase):
+    def test_a_voxel_is_what_the_field_delivers_there(self):
+        position = np.array([0.1, 0.2, 0.3])
+        coverage = coverageMap(room(), position, 1e-3, 2.4e9, spacing=0.5)
+        for index in [(2, 3, 4), (9, 2, 6), (13, 12, 1)]:
+            point = coverage.points()[index]
+            env = FakeEnvironment(room())
+            field = SemanticField(3e8, 1e-15) # fast enough to deliver the echoes with the direct front
+            field.environment = env
+            radio = Radio(env, tuple(point))
+            field.addObject(radio)
+            field.update(0.0) # to see where the radio is
+            field.pushEmission(Radio(env, tuple(position)), 2.4e9, 1e-3, env.time)
+            runField(field, env, 2)
+            self.assertEqual(len(radio.log), 1)
+            self.assertTrue(np.allclose(radio.log[0][1].intensity, coverage.intensity[index], rtol=1e-3))
+
+    def test_behind_a_wall_only_the_direct_path_counts(self):
+        position = np.array([0.0, 0.0, 0.0])
+        coverage = coverageMap([planeWall(0, 3.0)], position, 1e-3, 2.4e9, spacing=0.5)
+        points = coverage.points()
+        behind = points[..., 0] > 3.1
+        r2 = (points[behind]**2).sum(axis=1)
+        self.assertTrue(np.allclose(coverage.intensity[behind], 1e-3*0.75/r2*np.cos(2*np.pi*np.sqrt(r2)*2.4e9)**2))
+
+    def test_cached_maps_are_reloaded(self):
+        cacheDir = tempfile.mkdtemp()
+        try:
+            position = (0.1, 0.2, 0.3)
+            built = coverageMap(room(), position, 1e-3, 2.4e9, spacing=0.5, cacheDir=cacheDir)
+            self.assertEqual(len(os.listdir(cacheDir)), 1)
+            chunk = heatmap._coverageChunk
+            def noWorking(*args):
+                raise AssertionError('worked out again')
+            heatmap._coverageChunk = noWorking
+            try:
+                loaded = coverageMap(room(), position, 1e-3, 2.4e9, spacing=0.5, cacheDir=cacheDir)
+            finally:
+                heatmap._coverageChunk = chunk
+            self.assertIsInstance(loaded.intensity, np.memmap)
+            np.testing.assert_array_equal(loaded.intensity, built.intensity)
+            self.assertEqual(len(os.listdir(cacheDir)), 1)
+            # elsewhere is another map
+            coverageMap(room(), (0.5, 0.2, 0.3), 1e-3, 2.4e9, spacing=0.5, cacheDir=cacheDir)
+            self.assertEqual(len(os.listdir(cacheDir)), 2)
+        finally:
+            shutil.rmtree(cacheDir)
+
+if __name__ == '__main__':
+    unittest.main()
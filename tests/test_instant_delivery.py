@@ -0,0 +1,38 @@
+import unittest
+from field_fakes import FakeEnvironment, FakeReceiver, planeWall, recording, runField
+from field_types import Field
+
+RecordingField = recording(Field)
+
+class TrackedField(RecordingField):
+    def propagatesInstantly(self):
+        return False # track the fronts from step to step even though they don't need it
+
+class InstantDeliveryTest(unittest.TestCase):
+    """Fronts fast enough to be delivered instantly must reach the receivers that tracking them would"""
+    def deliveries(self, fieldClass):
+        env = FakeEnvironment([planeWall(0, 4.0), planeWall(1, -2.0)])
+        field = fieldClass(3e8, minI=0.05)
+        field.environment = env
+        receivers = [FakeReceiver(env, (x, 0.5, 0.0), isStatic=(k % 2 == 0)) for k, x in enumerate((-6.0, -2.0, 1.0, 3.0))]
+        for r in receivers:
+            field.addObject(r)
+        source = FakeReceiver(env, (0.0, 0.0, 0.0))
+        field.update(0.0) # to see where the receivers are first
+        env.time += env.dt
+        field.pushEmission(source, 1.0, 10.0, env.time)
+        runField(field, env, 4)
+        self.assertEqual(field.propagatesInstantly(), fieldClass is RecordingField)
+        # which fronts arrive, as (arrival time, phase shift): a tracked front this fast takes its
+        # reflection loss for the whole step, so the intensities needn't match
+        return [sorted((hit[0], hit[2]) for t, hits in r.log for hit in hits) for r in receivers]
+
+    def test_instant_and_tracked_fronts_agree(self):
+        instant = self.deliveries(RecordingField)
+        tracked = self.deliveries(TrackedField)
+        self.assertEqual(instant, tracked)
+        # including the far receivers, where the fronts are weaker than minI
+        self.assertTrue(all(len(hits) > 0 for hits in instant))
+
+if __name__ == '__main__':
+    unittest.main()
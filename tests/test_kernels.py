@@ -0,0 +1,60 @@
+import unittest
+import numpy as np
+from field_fakes import FakeEnvironment, FakeReceiver, planeWall, recording, runField
+from field_kernels import getKernels, numba
+from field_types import Field
+from wavefront_table import WavefrontTable
+
+def randomTable(kernels, seed, n=40):
+    rng = np.random.RandomState(seed)
+    table = WavefrontTable(kernels=kernels)
+    table.append(rng.uniform(-5, 5, (n, 3)), rng.uniform(0, 0.2, n), rng.uniform(0.1, 10, n), 1.0, [None]*n,
+                 baseFactor=rng.uniform(0.2, 1, n), reflectAt=rng.uniform(0, 8, n), activation=rng.uniform(0, 3, n)*(rng.rand(n) < 0.5))
+    return table
+
+class KernelParityTest(unittest.TestCase):
+    """Every backend computes the same thing as the numpy one"""
+    backends = ['python'] + (['numba'] if numba is not None else [])
+
+    def test_advance_and_crossings(self):
+        rng = np.random.RandomState(3)
+        positions = rng.uniform(-5, 5, (10, 3))
+        previous = positions + rng.normal(0, 0.3, (10, 3))
+        for name in self.backends:
+            tables = [randomTable(getKernels('numpy'), 1), randomTable(getKernels(name), 1)]
+            for now in (0.05, 0.1, 0.15, 0.2, 0.25):
+                results = []
+                for table in tables:
+                    table.advance(now, 20.0, 0.75)
+                    rows, receivers = [a.ravel() for a in np.meshgrid(np.arange(len(table)), np.arange(10), indexing='ij')]
+                    p, q = positions[receivers], previous[receivers]
+                    hit, d2 = table.crossings(rows, p, np.einsum('ij,ij->i', p, p), q, np.einsum('ij,ij->i', q, q))
+                    results.append((table.radius.copy(), table.intensity.copy(), table.wasActive.copy(), hit, d2))
+                for expected, got in zip(*results):
+                    np.testing.assert_allclose(got, expected, err_msg=name)
+
+    def test_interfere(self):
+        rng = np.random.RandomState(5)
+        args = [rng.uniform(0, 1, 30), rng.uniform(0, 10, 30), rng.uniform(1, 100, 30), rng.choice([0, np.pi], 30)]
+        expected = getKernels('numpy').interfere(*args)
+        for name in self.backends:
+            np.testing.assert_allclose(getKernels(name).interfere(*args), expected, err_msg=name)
+
+    def test_fields_deliver_the_same(self):
+        def deliveries(backend):
+            env = FakeEnvironment([planeWall(0, 3.0), planeWall(1, -1.0)])
+            field = recording(Field)(20.0, 1e-4, backend=backend)
+            field.environment = env
+            receivers = [FakeReceiver(env, (x, 0.0, 1.0), isStatic=(x > 0)) for x in (-2.0, -0.5, 1.0, 2.5)]
+            for r in receivers:
+                field.addObject(r)
+            field.pushEmissions(FakeReceiver(env, (0.0, 0.0, 0.0)), 1.0, [5.0, 3.0], [0.0, 0.05])
+            runField(field, env, 16)
+            return [r.log for r in receivers]
+        expected = deliveries('numpy')
+        self.assertTrue(sum(map(len, expected)) > 0)
+        for name in self.backends:
+            self.assertEqual(deliveries(name), expected, name)
+
+if __name__ == '__main__':
+    unittest.main()
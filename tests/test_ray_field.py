@@ -0,0 +1,77 @@
+import unittest
+import ode
+from field_fakes import FakeEnvironment, FakeReceiver, planeWall, recording
+from field_types import RayField
+
+RecordingRayField = recording(RayField)
+
+def runRays(field, env, steps):
+    for _ in range(steps):
+        env.time += env.dt
+        field.update(env.time)
+
+class ShellDeliveryTest(unittest.TestCase):
+    """Each ray path delivers an emission once, when the front gets to the end of it"""
+    def deliveries(self, steps, dt):
+        env = FakeEnvironment([planeWall(0, 7.0)], dt=dt)
+        field = RecordingRayField(20.0, dPhi=4, dTheta=4, tracer='numpy')
+        field.receiverSize = 1.0 # big enough to catch the echo's rays too
+        receiver = FakeReceiver(env, (5.0, 0.0, 0.0))
+        source = FakeReceiver(env, (0.0, 0.0, 0.0))
+        field.addObject(receiver)
+        field.addObject(source)
+        field.pushEmission(source, 1.0, 10.0, 0.0)
+        runRays(field, env, steps)
+        return [hit for t, hits in receiver.log for hit in hits]
+
+    def test_one_detection_per_path(self):
+        stepped = self.deliveries(40, 0.025)
+        once = self.deliveries(1, 1.0) # every path at once
+        self.assertTrue(any(hit[0] > 7.0/20.0 for hit in once)) # including the wall's echo
+        self.assertEqual(sorted(stepped), sorted(once))
+
+
+class Device(object):
+    def __init__(self, space, position, size=0.5):
+        geom = ode.GeomBox(space, (size, size, size))
+        geom.setPosition(position)
+        self.geomList = [geom]
+
+class DeviceReceiver(FakeReceiver):
+    def __init__(self, environment, position, **kwargs):
+        super(DeviceReceiver, self).__init__(environment, position, **kwargs)
+        self.device = Device(environment.space, position)
+
+class OdeEnvironment(FakeEnvironment):
+    def __init__(self, dt):
+        super(OdeEnvironment, self).__init__(dt=dt)
+        self.space = ode.HashSpace()
+        self.devices = []
+
+    def getObjectFromGeom(self, geom):
+        for device in self.devices:
+            if geom in device.geomList:
+                return device
+        return None
+
+class TracerTest(unittest.TestCase):
+    """The ode and numpy tracers deliver the same thing from the same rays"""
+    def deliveries(self, tracer):
+        env = OdeEnvironment(0.05)
+        field = RecordingRayField(20.0, dPhi=10, dTheta=10, tracer=tracer)
+        receivers = [DeviceReceiver(env, p) for p in ((3.0, 0.0, 0.0), (0.0, -2.0, 1.0))]
+        source = DeviceReceiver(env, (0.0, 0.0, 0.0))
+        for o in receivers + [source]:
+            env.devices.append(o.device)
+            field.addObject(o)
+        field.pushEmissions(source, 1.0, [10.0, 5.0], [0.0, 0.06])
+        runRays(field, env, 8)
+        return [r.log for r in receivers]
+
+    def test_tracers_agree(self):
+        expected = self.deliveries('numpy')
+        self.assertTrue(all(len(log) > 0 for log in expected))
+        self.assertEqual(self.deliveries('ode'), expected)
+
+if __name__ == '__main__':
+    unittest.main()
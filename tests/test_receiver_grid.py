@@ -0,0 +1,37 @@
+import unittest
+import numpy as np
+import field_fakes # puts the package on the path
+from spatial_index import ReceiverGrid
+
+class ReceiverGridTest(unittest.TestCase):
+    def test_query_finds_every_receiver_in_the_shell(self):
+        rng = np.random.RandomState(7)
+        grid = ReceiverGrid((-5, -5, -5), (5, 5, 5), cellSize=1.5)
+        positions = rng.uniform(-6, 6, (200, 3)) # some outside the layout
+        grid.refit(positions)
+        centers = rng.uniform(-5, 5, (50, 3))
+        lastRadius = rng.uniform(0, 4, 50)
+        radius = lastRadius + rng.uniform(0, 2, 50)
+        rows, receivers = grid.query(centers, lastRadius, radius)
+        candidates = set(zip(rows.tolist(), receivers.tolist()))
+        d = np.linalg.norm(centers[:, None, :] - positions[None, :, :], axis=2)
+        inShell = np.argwhere((d <= radius[:, None]) & (d > lastRadius[:, None]))
+        self.assertTrue(len(inShell) > 0)
+        for i, j in inShell:
+            self.assertIn((i, j), candidates)
+        self.assertTrue(len(candidates) < d.size) # and it does prune
+
+    def test_moved_receivers_are_still_found(self):
+        grid = ReceiverGrid((0, 0, 0), (10, 10, 10), cellSize=2.0)
+        grid.refit([(5.0, 5.0, 5.0)], displacement=[3.0])
+        # the shell passed where the receiver was before it moved 3 away
+        rows, receivers = grid.query(np.array([(0.0, 5.0, 5.0)]), np.array([6.0]), np.array([7.0]))
+        self.assertEqual(receivers.tolist(), [0])
+
+    def test_empty_grid(self):
+        grid = ReceiverGrid((0, 0, 0), (1, 1, 1))
+        rows, receivers = grid.query(np.zeros((3, 3)), np.zeros(3), np.ones(3))
+        self.assertEqual((len(rows), len(receivers)), (0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
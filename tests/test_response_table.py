@@ -0,0 +1,112 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from field_fakes import FakeEnvironment, FakeReceiver, planeWall, recording, runField
+from field_types import Field, TabulatedField
+from image_sources import ReflectingSurfaces
+import response_table
+from response_table import ResponseTable, firstPlanes, imageLengths, tableKey, cachedTable
+
+def room():
+    return [planeWall(0, 3.0), planeWall(0, -2.0), planeWall(1, 2.5)]
+
+receivers = np.array([(1.0, 0.5, 0.0), (-1.0, -1.0, 0.5), (4.0, 0.0, 0.0)])
+
+def planesAt(obstacleList, point):
+    return firstPlanes(*ReflectingSurfaces(obstacleList).nearestPlanes(point))[0]
+
+class ResponseTableTest(unittest.TestCase):
+    def setUp(self):
+        self.table = ResponseTable.build(room(), receivers, 0.25)
+
+    def test_lookup_interpolates_the_path_lengths(self):
+        point = np.array([0.3, -0.4, 0.1])
+        planes = planesAt(room(), point)
+        exact = imageLengths(point[None, :], planes[None, :], receivers)[0]
+        found = self.table.lookup(point, planes)
+        self.assertEqual(found.shape, (len(receivers), response_table.PATHS))
+        self.assertTrue(np.array_equal(np.isnan(found), np.isnan(exact)))
+        known = ~np.isnan(exact)
+        self.assertTrue(np.allclose(found[known], exact[known], atol=0.01))
+        # no echo off the wall at x=3 for the receiver behind it, nor off the planes that aren't there
+        self.assertTrue(np.isnan(found[2, 1]))
+        self.assertTrue(np.isnan(found[:, [2, 4, 5]]).all())
+
+    def test_lookup_outside_the_grid(self):
+        point = np.array([0.0, 0.0, 50.0])
+        self.assertIsNone(self.table.lookup(point, planesAt(room(), point)))
+
+    def test_lookups_at_once_agree_with_one_at_a_time(self):
+        points = np.array([(0.3, -0.4, 0.1), (2.95, 1.0, 0.0), (0.0, 0.0, 50.0), (-1.5, 2.0, -0.2)])
+        planes = firstPlanes(*ReflectingSurfaces(room()).nearestPlanesOf(points))
+        distance, inside = self.table.lookupOf(points, planes)
+        self.assertEqual(list(inside), [True, True, False, True])
+        for n, point in enumerate(points):
+            single = self.table.lookup(point, planes[n])
+            if single is None:
+                self.assertTrue(np.isnan(distance[n]).all())
+            else:
+                self.assertTrue(np.allclose(distance[n], single, equal_nan=True))
+
+class CachedTableTest(unittest.TestCase):
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cacheDir)
+
+    def test_a_built_table_is_loaded_next_time(self):
+        built = cachedTable(room(), receivers, 0.5, self.cacheDir)
+        self.assertEqual(len(os.listdir(self.cacheDir)), 1)
+        build = ResponseTable.build
+        def noBuilding(*args):
+            raise AssertionError('built again')
+        ResponseTable.build = classmethod(noBuilding)
+        try:
+            loaded = cachedTable(room(), receivers, 0.5, self.cacheDir)
+        finally:
+            ResponseTable.build = build
+        np.testing.assert_array_equal(loaded.distance, built.distance)
+        np.testing.assert_array_equal(loaded.planes, built.planes)
+
+    def test_the_key_changes_with_the_layout(self):
+        moved = room()
+        moved[0] = planeWall(0, 3.5)
+        self.assertNotEqual(tableKey(room(), receivers, 0.5), tableKey(moved, receivers, 0.5))
+        self.assertNotEqual(tableKey(room(), receivers, 0.5), tableKey(room(), receivers[:2], 0.5))
+        self.assertEqual(tableKey(room(), receivers, 0.5), tableKey(room(), receivers.copy(), 0.5))
+
+class TabulatedEchoTest(unittest.TestCase):
+    """The tabulated field's first echoes arrive when the image-source field's do"""
+    def arrivals(self, fieldClass, cacheDir):
+        env = FakeEnvironment(room())
+        if fieldClass is TabulatedField:
+            field = recording(fieldClass)(20.0, 1e-6, cacheDir=cacheDir)
+        else:
+            field = recording(fieldClass)(20.0, minI=1e-6)
+        field.environment = env
+        listeners = [FakeReceiver(env, p) for p in receivers]
+        for r in listeners:
+            field.addObject(r)
+        for n, p in enumerate([(0.3, -0.4, 0.1), (-1.5, 2.0, -0.2)]):
+            field.pushEmission(FakeReceiver(env, p), 1.0, 10.0, 0.01*n)
+        runField(field, env, 20)
+        return [sorted((hit[0], hit[2]) for t, hits in r.log for hit in hits) for r in listeners]
+
+    def test_echoes_arrive_with_the_image_sources(self):
+        cacheDir = tempfile.mkdtemp()
+        try:
+            tabulated = self.arrivals(TabulatedField, cacheDir)
+        finally:
+            shutil.rmtree(cacheDir)
+        expected = self.arrivals(Field, None)
+        self.assertTrue(all(any(phase > 0 for _, phase in hits) for hits in expected))
+        self.assertEqual([len(hits) for hits in tabulated], [len(hits) for hits in expected])
+        for hits, wanted in zip(tabulated, expected):
+            self.assertEqual([phase for _, phase in hits], [phase for _, phase in wanted])
+            self.assertTrue(np.allclose([tArr for tArr, _ in hits], [tArr for tArr, _ in wanted], atol=1e-3))
+
+if __name__ == '__main__':
+    unittest.main()
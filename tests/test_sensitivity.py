@@ -0,0 +1,28 @@
+import unittest
+from field_fakes import FakeEnvironment, FakeReceiver, recording, runField
+from field_types import Field, SemanticField
+
+class SensitivityTest(unittest.TestCase):
+    """Receivers don't get waves too weak for them, unless the field sums interference"""
+    def hits(self, fieldClass, isStatic):
+        env = FakeEnvironment()
+        field = recording(fieldClass)(20.0, 1e-6)
+        field.environment = env
+        receiver = FakeReceiver(env, (1.0, 0.0, 0.0), isStatic=isStatic, sensitivity=1.0)
+        field.addObject(receiver)
+        field.update(0.0)
+        field.pushEmission(FakeReceiver(env, (0.0, 0.0, 0.0)), 1.0, 10.0, 0.0)
+        field.pushEmission(FakeReceiver(env, (2.0, 0.0, 0.0)), 1.0, 0.5, 0.0) # 0.5 at the receiver
+        runField(field, env, 6)
+        return sorted(hit[1] for t, hits in receiver.log for hit in hits)
+
+    def test_weak_waves_are_culled(self):
+        for isStatic in (True, False):
+            self.assertEqual(self.hits(Field, isStatic), [10.0])
+
+    def test_weak_waves_still_interfere(self):
+        for isStatic in (True, False):
+            self.assertEqual(self.hits(SemanticField, isStatic), [0.5, 10.0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+from field_fakes import FakeEnvironment, FakeReceiver, planeWall, recording, runField
+from field_types import Field
+
+class ShardedIntersectorTest(unittest.TestCase):
+    """Sharding the front/receiver tests across workers must not change what gets delivered"""
+    def deliveries(self, workers):
+        env = FakeEnvironment([planeWall(0, 3.0), planeWall(1, -2.0)])
+        field = recording(Field)(20.0, 1e-4, workers=workers)
+        field.intersector.minShardRows = 4 # so a handful of fronts gets split up
+        field.environment = env
+        receivers = [FakeReceiver(env, (x, 0.5*x, 0.0), isStatic=False, velocity=(0.5, 0.0, 0.0))
+                     for x in (-2.0, -1.0, 0.5, 1.5, 2.5)]
+        for r in receivers:
+            field.addObject(r)
+        sources = [FakeReceiver(env, (0.0, y, 0.0)) for y in (-1.0, 0.0, 1.0)]
+        for k, source in enumerate(sources):
+            field.pushEmissions(source, 1.0, [5.0, 6.0, 7.0], [0.0, 0.01*k, 0.02*k])
+        try:
+            runField(field, env, 16)
+            sharded = field.intersector.pool is not None
+        finally:
+            field.close()
+        return sharded, [r.log for r in receivers]
+
+    def test_workers_deliver_what_the_field_does_in_process(self):
+        inProcess, expected = self.deliveries(0)
+        sharded, logs = self.deliveries(2)
+        self.assertFalse(inProcess)
+        self.assertTrue(sharded)
+        self.assertTrue(any(len(log) > 0 for log in expected))
+        self.assertEqual(logs, expected)
+
+if __name__ == '__main__':
+    unittest.main()
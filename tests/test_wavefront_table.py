@@ -0,0 +1,60 @@
+import unittest
+import numpy as np
+import field_fakes # puts the package on the path
+from wavefront_table import WavefrontTable
+
+class WavefrontTableTest(unittest.TestCase):
+    def spawn(self, table, n, t1=0.0):
+        centers = np.arange(3*n, dtype=np.float64).reshape(n, 3)
+        return table.append(centers, t1, 4*np.pi, 1.0, ['source%d' % i for i in range(n)], data=list(range(n)))
+
+    def test_append_grows_and_keeps_rows(self):
+        table = WavefrontTable(capacity=2)
+        first = self.spawn(table, 3)
+        second = self.spawn(table, 70)
+        self.assertEqual((first, second), (slice(0, 3), slice(3, 73)))
+        self.assertEqual(len(table), 73)
+        self.assertTrue(table.capacity >= 73)
+        np.testing.assert_array_equal(table.ids, np.arange(73))
+        np.testing.assert_array_equal(table.centers[1], [3.0, 4.0, 5.0])
+        self.assertEqual(table.center2[1], 9.0 + 16.0 + 25.0)
+        self.assertEqual((table.source[4], table.data[4]), ('source1', 1))
+        self.assertTrue(np.isnan(table.intensity).all())
+
+    def test_discard_keeps_ids_sorted(self):
+        table = WavefrontTable()
+        self.spawn(table, 6)
+        self.assertEqual(table.discard([1, 4, 99]), 2)
+        np.testing.assert_array_equal(table.ids, [0, 2, 3, 5])
+        np.testing.assert_array_equal(table.rowsForIds([5, 1, 0, 3]), [3, -1, 0, 2])
+        self.assertEqual(list(table.data), [0, 2, 3, 5])
+        self.spawn(table, 1) # ids are never reused
+        self.assertEqual(table.ids[-1], 6)
+
+    def test_advance_decays_and_reflects(self):
+        table = WavefrontTable()
+        self.spawn(table, 3)
+        table.t1[2] = 2.0 # not emitted yet
+        table.reflectAt[1] = 1.0
+        table.advance(1.0, 2.0, transmittedFraction=0.75)
+        np.testing.assert_allclose(table.radius, [2.0, 2.0, -2.0])
+        np.testing.assert_allclose(table.intensity[:2], [1.0/4, 0.75/4])
+        self.assertTrue(np.isnan(table.intensity[2]))
+        self.assertFalse(table.wasActive.any())
+        table.advance(2.0, 2.0, transmittedFraction=0.75)
+        np.testing.assert_array_equal(table.wasActive, [True, True, False])
+        np.testing.assert_allclose(table.lastRadius, [2.0, 2.0, -2.0])
+
+    def test_pair_values_never_round_up(self):
+        table = WavefrontTable()
+        self.spawn(table, 2)
+        table.reservePairSlots(3)
+        value = 0.1 + 1e-9
+        table.setPairValues(np.array([0, 1]), np.array([2, 2]), [value, value])
+        self.assertTrue((table.pairState()[:, 2] <= value).all())
+        self.assertTrue((table.pairState()[:, :2] == WavefrontTable.pairFill).all())
+        table.resetPairSlot(2)
+        self.assertTrue((table.pairState() == WavefrontTable.pairFill).all())
+
+if __name__ == '__main__':
+    unittest.main()
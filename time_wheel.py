@@ -0,0 +1,89 @@
+import heapq
+import itertools as it
+import numpy as np
+
+class TimeWheel(object):
+    """Hierarchical timing wheel.
+
+       Items are filed by the tick (time/resolution) they fall due in. Level 0 has
+       one slot per tick; each slot of level L covers slotsPerLevel**L ticks, and
+       its items are spread over the lower levels when the wheel reaches it.
+       Items too far ahead for the top level wait in an overflow heap. Popping
+       what is due costs time in the number of due items (plus one slot per
+       elapsed tick), not in the number of items stored.
+    """
+    def __init__(self, resolution, start=0.0, slotsPerLevel=64, levels=4):
+        self.resolution = float(resolution)
+        self.slots = slotsPerLevel
+        self.levels = [[[] for _ in range(slotsPerLevel)] for _ in range(levels)]
+        self.tick = self._tickOf(start) - 1 # last tick that has been emptied
+        self.overflow = [] # heap of (tick, tiebreak, entry)
+        self.due = [] # entries whose tick has passed, but whose exact time hasn't
+        self._count = it.count()
+        self.size = 0
+        self.filed = 0 # entries in the slots
+
+    def __len__(self):
+        return self.size
+
+    def _tickOf(self, t):
+        return int(np.floor(t/self.resolution))
+
+    def _place(self, entry):
+        tick = self._tickOf(entry[0])
+        if tick <= self.tick:
+            self.due.append(entry)
+            return
+        for level in range(len(self.levels)):
+            span = self.slots**(level+1)
+            if tick//span == self.tick//span:
+                self.levels[level][(tick//self.slots**level) % self.slots].append(entry)
+                self.filed += 1
+                return
+        heapq.heappush(self.overflow, (tick, next(self._count), entry))
+
+    def add(self, t, item):
+        if not np.isfinite(t):
+            return # never due
+        self._place((t, item))
+        self.size += 1
+
+    def _advanceTo(self, target):
+        top = self.slots**len(self.levels)
+        while self.tick < target:
+            if self.filed == 0:
+                # nothing in the slots: jump to the next block that has overflow in it
+                upTo = target
+                if len(self.overflow) > 0:
+                    upTo = min(target, (self.overflow[0][0]//top)*top - 1)
+                if upTo > self.tick:
+                    self.tick = upTo
+                    continue
+            self.tick += 1
+            # cascade the higher levels whose slot boundary we just crossed
+            if self.tick % top == 0:
+                while len(self.overflow) > 0 and self.overflow[0][0]//top == self.tick//top:
+                    self._place(heapq.heappop(self.overflow)[2])
+            for level in range(len(self.levels)-1, 0, -1):
+                width = self.slots**level
+                if self.tick % width == 0:
+                    slot = self.levels[level][(self.tick//width) % self.slots]
+                    entries = list(slot)
+                    del slot[:]
+                    self.filed -= len(entries)
+                    for entry in entries:
+                        self._place(entry)
+            slot = self.levels[0][self.tick % self.slots]
+            self.due.extend(slot)
+            self.filed -= len(slot)
+            del slot[:]
+
+    def pop(self, now):
+        """ Remove and return all items due at or before now """
+        self._advanceTo(self._tickOf(now))
+        ready = [e for e in self.due if e[0] <= now]
+        if len(ready) == 0:
+            return []
+        self.due = [e for e in self.due if e[0] > now]
+        self.size -= len(ready)
+        return [e[1] for e in ready]
@@ -0,0 +1,194 @@
+import numpy as np
+from field_kernels import NumpyKernels
+
+class WavefrontTable(object):
+    """Structure-of-arrays store for the live wavefronts of a Field.
+
+       Every column is a contiguous numpy array with one entry per wavefront,
+       so spawning, advancing, intersecting and discarding work on whole
+       columns at once. The attribute for each column (e.g. self.radius) is a
+       view of the first self.size entries of a larger backing buffer, which
+       grows by doubling.
+       Per-pair state (when a front next needs testing against a receiver)
+       lives in one 2-D array, with a column per receiver slot. Fields hand
+       out the slots as dense receiver ids.
+    """
+    startR = 0.00001
+    initialCapacity = 64
+    pairFill = -np.inf
+    pairDtype = np.float32 # values are rounded down when stored, so a check only ever comes early
+
+    # name, dtype, per-row shape, fill value for new rows
+    columns = (('ids', np.int64, (), -1),
+               ('centers', np.float64, (3,), 0.0),
+               ('center2', np.float64, (), 0.0),
+               ('t1', np.float64, (), 0.0),
+               ('power', np.float64, (), 0.0),
+               ('frequency', np.float64, (), 0.0),
+               ('band', np.int64, (), -1),
+               ('phaseShift', np.float64, (), 0.0),
+               ('baseFactor', np.float64, (), 1.0),
+               ('intensityFactor', np.float64, (), 1.0),
+               ('radius', np.float64, (), startR),
+               ('lastRadius', np.float64, (), 0.0),
+               ('intensity', np.float64, (), np.nan), # nan until the front has left its source
+               ('wasActive', np.bool_, (), False), # had an intensity before the last advance
+               ('parent', np.int64, (), -1), # id of the direct front an image front was mirrored from
+               ('activation', np.float64, (), 0.0), # radius before which an image front isn't physical yet
+               ('reflectAt', np.float64, (), np.inf), # radius at which the front first reflects off a surface
+               ('regionLow', np.float64, (3,), -np.inf), # box an image front's path exists in: the source's
+               ('regionHigh', np.float64, (3,), np.inf), # side of every plane it was mirrored in
+               ('source', object, (), None),
+               ('data', object, (), None))
+
+    def __init__(self, capacity=None, kernels=None):
+        if kernels is None:
+            kernels = NumpyKernels()
+        self.kernels = kernels
+        if capacity is None:
+            capacity = self.initialCapacity
+        self.size = 0
+        self.nextId = 0
+        self.capacity = max(int(capacity), 1)
+        self._store = {}
+        for name, dtype, shape, fill in self.columns:
+            self._store[name] = self._newColumn(dtype, shape, fill)
+        self.pairSlots = 0
+        self._pairs = np.empty((self.capacity, 0), dtype=self.pairDtype)
+        self._refreshViews()
+
+    def __len__(self):
+        return self.size
+
+    def _newColumn(self, dtype, shape, fill):
+        col = np.empty((self.capacity,)+shape, dtype=dtype)
+        col.fill(fill)
+        return col
+
+    def _refreshViews(self):
+        n = self.size
+        for name, _, _, _ in self.columns:
+            setattr(self, name, self._store[name][:n])
+
+    def _grow(self, needed):
+        newCapacity = self.capacity
+        while newCapacity < needed:
+            newCapacity *= 2
+        if newCapacity == self.capacity:
+            return
+        self.capacity = newCapacity
+        for name, dtype, shape, fill in self.columns:
+            old = self._store[name]
+            col = self._newColumn(dtype, shape, fill)
+            col[:self.size] = old[:self.size]
+            self._store[name] = col
+        pairs = self._newColumn(self.pairDtype, (self.pairSlots,), self.pairFill)
+        pairs[:self.size] = self._pairs[:self.size]
+        self._pairs = pairs
+
+    def reservePairSlots(self, n):
+        """ Make room for receiver slots 0..n-1 """
+        if n <= self.pairSlots:
+            return
+        slots = max(n, 2*self.pairSlots)
+        pairs = self._newColumn(self.pairDtype, (slots,), self.pairFill)
+        pairs[:, :self.pairSlots] = self._pairs
+        self._pairs = pairs
+        self.pairSlots = slots
+
+    def resetPairSlot(self, slot):
+        self._pairs[:, slot] = self.pairFill
+
+    def pairState(self):
+        """ The next-check time of every (front, receiver slot) pair """
+        return self._pairs[:self.size]
+
+    def setPairValues(self, rows, slots, values):
+        values = np.asarray(values, dtype=np.float64)
+        stored = values.astype(self.pairDtype)
+        over = stored > values
+        stored[over] = np.nextafter(stored[over], self.pairDtype(-np.inf))
+        self._pairs[rows, slots] = stored
+
+    def nbytes(self):
+        """ Memory held by the columns and pair state (object columns count their references only) """
+        return sum(col.nbytes for col in self._store.values()) + self._pairs.nbytes
+
+    def append(self, centers, t1, power, frequency, sources, data=None, **columns):
+        """ Add a batch of new wavefronts. Other columns can be given by name, otherwise
+            they start at their fill value. Returns the slice of rows they occupy """
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+        n = len(centers)
+        start = self.size
+        stop = start + n
+        if n == 0:
+            return slice(start, stop)
+        self._grow(stop)
+        s = self._store
+        for name, _, _, fill in self.columns:
+            s[name][start:stop] = fill
+        s['ids'][start:stop] = np.arange(self.nextId, self.nextId+n)
+        s['centers'][start:stop] = centers
+        s['center2'][start:stop] = np.einsum('ij,ij->i', centers, centers)
+        s['t1'][start:stop] = t1
+        s['power'][start:stop] = power
+        s['frequency'][start:stop] = frequency
+        for name, values in columns.items():
+            s[name][start:stop] = values
+        # object columns need element-wise assignment, or numpy tries to broadcast sequences
+        src = s['source']
+        dst = s['data']
+        for i in range(n):
+            src[start+i] = sources[i]
+            dst[start+i] = None if data is None else data[i]
+        self._pairs[start:stop] = self.pairFill
+        self.nextId += n
+        self.size = stop
+        self._refreshViews()
+        return slice(start, stop)
+
+    def advance(self, now, speed, transmittedFraction=1.0):
+        """ Move every front to its radius at time now, and update intensities under inverse-square decay.
+            Fronts that have reached their first reflecting surface keep transmittedFraction of their power. """
+        self.kernels.advance(self, now, speed, transmittedFraction)
+
+    def hasIntensity(self):
+        return ~np.isnan(self.intensity)
+
+    def crossings(self, rows, positions, pos2, previous, prev2):
+        """ Which of the (row, receiver) pairs the fronts swept over since the last update; see the kernels """
+        return self.kernels.crossings(self, rows, positions, pos2, previous, prev2)
+
+    def discard(self, ids):
+        """ Drop the wavefronts with the given ids, if they are still around """
+        if len(ids) == 0:
+            return 0
+        rows = self.rowsForIds(ids)
+        rows = rows[rows >= 0]
+        if len(rows) == 0:
+            return 0
+        keep = np.ones(self.size, dtype=bool)
+        keep[rows] = False
+        self.compact(keep)
+        return len(rows)
+
+    def compact(self, keep):
+        keep = np.flatnonzero(keep)
+        n = len(keep)
+        for name, _, _, _ in self.columns:
+            col = self._store[name]
+            col[:n] = col[keep]
+        self._pairs[:n] = self._pairs[keep]
+        # don't hold on to payloads of discarded fronts
+        self._store['source'][n:self.size] = None
+        self._store['data'][n:self.size] = None
+        self.size = n
+        self._refreshViews()
+
+    def rowsForIds(self, ids):
+        """ Row index of each wavefront id, or -1 if it has been discarded. Rows are always sorted by id. """
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = np.searchsorted(self.ids, ids)
+        found = rows < self.size
+        found[found] = self.ids[rows[found]] == ids[found]
+        return np.where(found, rows, -1)